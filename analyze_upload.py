@@ -13,6 +13,9 @@ from webdriver_manager.chrome import ChromeDriverManager
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 from config import load_config
+from note_traffic import har_from_performance_log, save_har
+
+HAR_OUTPUT = os.path.join("fixtures", "note_upload.har")
 
 def analyze_upload():
     config = load_config()
@@ -109,6 +112,14 @@ def analyze_upload():
         if not found:
             print("[WARN] No obvious upload request found.")
 
+        # Save the API exchanges as a HAR fixture for replay_note_api.py
+        def get_body(request_id):
+            result = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            return None if result.get('base64Encoded') else result.get('body')
+
+        os.makedirs(os.path.dirname(HAR_OUTPUT), exist_ok=True)
+        save_har(har_from_performance_log(logs, get_body), HAR_OUTPUT, creator="analyze_upload")
+
     except Exception as e:
         print(f"[ERROR] Analysis failed: {e}")
         import traceback
@@ -0,0 +1,94 @@
+import os
+import sys
+import argparse
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+from config import ConfigWatcher, validate_config
+from batch_runner import BatchRunner, Checkpoint, load_jobs
+from main import (create_generator, create_image_generator, create_uploader, create_eyecatch_library,
+                  create_image_cache, create_section_images, generate_report, select_eyecatch)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and upload many articles (one per genre set) in one run.")
+    parser.add_argument("jobs", help="Text file with one genre set per line (e.g. '金融, 政治'), or a JSON/YAML list")
+    parser.add_argument("--checkpoint", help="Progress file (default: <jobs>.progress.json). Re-run to resume.")
+    parser.add_argument("--writers", type=int, help="Concurrent article generations (default: batch.writers)")
+    parser.add_argument("--uploaders", type=int, help="Concurrent uploads (default: batch.uploaders)")
+    parser.add_argument("--status", choices=["draft", "published"], help="Override upload_status")
+    args = parser.parse_args()
+
+    watcher = ConfigWatcher()
+    config = watcher.config
+    if not validate_config(config):
+        sys.exit(1)
+    batch_config = config.get('batch', {})
+    upload_status = args.status or config.get('upload_status', 'draft')
+
+    jobs = load_jobs(args.jobs)
+    if not jobs:
+        print(f"[ERROR] No jobs found in {args.jobs}")
+        sys.exit(1)
+
+    generator = create_generator(config)
+    image_generator = create_image_generator(config)
+    uploader = create_uploader(config, concurrent_articles=args.uploaders or batch_config.get('uploaders', 2))
+    if uploader is None:
+        sys.exit(1)
+    eyecatch_library = create_eyecatch_library(config)
+    image_cache = create_image_cache(config)
+    # Uploaders start from pooled drafts while the first articles are still being written
+    uploader.fill_draft_pool()
+
+    if image_generator is not None:
+        # Keep one pipeline (or worker process) resident for the whole batch
+        if hasattr(image_generator, 'keep_alive'):
+            image_generator.keep_alive = True
+            image_generator.max_jobs = float('inf')
+        image_generator.load()
+
+    def write(job):
+        return generate_report(watcher.render(), generator, job['genres'])
+
+    def illustrate(job):
+        job_config = watcher.render()
+        img_config = job_config.get('image_generation', {})
+        eyecatch = select_eyecatch(job_config, job['body'], generator, image_generator, eyecatch_library,
+                                   image_cache=image_cache)
+        section_images = None
+        if img_config.get('enabled', False) and image_generator and img_config.get('inline_images', {}).get('enabled', False):
+            section_images = create_section_images(job['body'], img_config, generator, image_generator,
+                                                   image_cache=image_cache)
+        return {"eyecatch": eyecatch, "section_images": section_images}
+
+    def upload(job):
+        return uploader.create_article(
+            job['title'],
+            job['body'],
+            status=upload_status,
+            eyecatch_path=job.get('eyecatch'),
+            section_images=job.get('section_images'),
+            upload_concurrency=config.get('image_generation', {}).get('inline_images', {}).get('upload_concurrency', 4)
+        )
+
+    runner = BatchRunner(
+        jobs,
+        Checkpoint(args.checkpoint or f"{os.path.splitext(args.jobs)[0]}.progress.json"),
+        write,
+        illustrate,
+        upload,
+        writers=args.writers or batch_config.get('writers', 2),
+        uploaders=args.uploaders or batch_config.get('uploaders', 2)
+    )
+    try:
+        runner.run()
+    finally:
+        if image_generator is not None:
+            image_generator.unload()
+        print("[INFO] Gemini latency stats:")
+        for line in generator.router.tracker.summary():
+            print(f"  {line}")
+        print(f"  {generator.caller.summary()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+from config import load_config
+from lazy_imports import current_rss_mb
+
+# variant name -> weights settings passed to LocalImageGenerator
+VARIANTS = {
+    "float32": {"dtype": "float32"},
+    "bfloat16": {"dtype": "bfloat16"},
+    "float16": {"dtype": "float16"},
+    "int8": {"dtype": "float32", "quantize": "int8"},
+}
+
+def parse_variant(spec, default_model):
+    """
+    'name[@interval][=path/to/model]', e.g. float32=models/x.fp16.safetensors, or int8@3
+    for int8 weights with the UNet feature cache recomputing the full UNet every 3 steps.
+    """
+    name, _, model = spec.partition("=")
+    name, _, interval = name.partition("@")
+    if name not in VARIANTS:
+        raise SystemExit(f"Unknown variant '{name}' (choose from {', '.join(VARIANTS)})")
+    unet_cache = {"enabled": True, "interval": int(interval)} if interval else None
+    return {"label": spec, "weights": VARIANTS[name], "unet_cache": unet_cache, "model_id": model or default_model}
+
+def run_variant(variant, render_kwargs, scheduler, threads, output_path):
+    """Runs in a fresh process so that memory figures are not skewed by earlier variants."""
+    from image_generator import LocalImageGenerator
+
+    rss_start = current_rss_mb()
+    generator = LocalImageGenerator(
+        model_id=variant["model_id"],
+        device="cpu",
+        scheduler_name=scheduler,
+        threads=threads,
+        weights=variant["weights"],
+        unet_cache=variant["unet_cache"]
+    )
+    start = time.perf_counter()
+    generator.load()
+    load_seconds = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+
+    start = time.perf_counter()
+    image = generator.render(**render_kwargs)
+    render_seconds = time.perf_counter() - start
+    rss_rendered = current_rss_mb()
+    image.save(output_path)
+
+    return {
+        "load_seconds": load_seconds,
+        "render_seconds": render_seconds,
+        "seconds_per_step": generator.last_render["seconds_per_step"],
+        "model_mb": rss_loaded - rss_start if rss_start is not None else None,
+        "rss_mb": rss_rendered,
+        "image": output_path
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CPU speed, memory and quality of weight formats and UNet caching against float32.")
+    parser.add_argument("--model", help="Model to benchmark (default: image_generation.model_id)")
+    parser.add_argument("--variants", nargs="+", default=["float32", "bfloat16", "int8"],
+                        help="Variants to run; the first one is the quality baseline. "
+                             "Use name=path to benchmark a converted checkpoint (e.g. bfloat16=models/x.bf16.safetensors) "
+                             "and name@N to enable the UNet feature cache with interval N (e.g. float32@3)")
+    parser.add_argument("--prompt", default="1girl, solo, white hair, reading a book, library, soft lighting")
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=os.path.join("benchmarks", "weights"))
+    args = parser.parse_args()
+
+    img_config = load_config().get('image_generation', {})
+    model_id = args.model or img_config.get('model_id', "runwayml/stable-diffusion-v1-5")
+    variants = [parse_variant(spec, model_id) for spec in args.variants]
+    render_kwargs = {
+        "prompt": args.prompt,
+        "negative_prompt": img_config.get('negative_prompt'),
+        "width": args.width,
+        "height": args.height,
+        "num_inference_steps": args.steps,
+        "seed": args.seed
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for index, variant in enumerate(variants):
+        output_path = os.path.join(args.output_dir, f"{index:02d}_{variant['label'].replace(os.sep, '_').replace('=', '_')}.png")
+        print(f"[INFO] Benchmarking {variant['label']} ({variant['model_id']})...")
+        with context.Pool(1) as pool:
+            result = pool.apply(run_variant, (variant, render_kwargs, img_config.get('scheduler', 'Euler a'),
+                                              img_config.get('threads'), output_path))
+        results.append((variant, result))
+
+    from PIL import Image
+    from weight_formats import psnr
+    baseline = Image.open(results[0][1]["image"])
+
+    print(f"\n[BENCH] {args.width}x{args.height}, {args.steps} steps, seed {args.seed} (baseline: {variants[0]['label']})")
+    print(f"  {'variant':<40} {'load':>7} {'s/step':>7} {'render':>8} {'speedup':>8} {'model MB':>9} {'RSS MB':>8} {'PSNR dB':>8}")
+    baseline_seconds = results[0][1]["render_seconds"]
+    for variant, result in results:
+        quality = psnr(Image.open(result["image"]), baseline)
+        model_mb = f"{result['model_mb']:.0f}" if result["model_mb"] is not None else "n/a"
+        rss_mb = f"{result['rss_mb']:.0f}" if result["rss_mb"] is not None else "n/a"
+        per_step = f"{result['seconds_per_step']:.2f}" if result["seconds_per_step"] else "n/a"
+        print(f"  {variant['label']:<40} {result['load_seconds']:6.1f}s {per_step:>7} {result['render_seconds']:7.1f}s "
+              f"{baseline_seconds / result['render_seconds']:7.2f}x {model_mb:>9} {rss_mb:>8} {quality:8.2f}")
+    print(f"  Images: {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+import sys
+import argparse
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+from weight_formats import DTYPES, converted_path, convert_checkpoint
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a Stable Diffusion model to half-precision weights (one-time).")
+    parser.add_argument("model", help="Single-file checkpoint (models/*.safetensors, .ckpt) or a Diffusers model folder")
+    parser.add_argument("--dtype", choices=DTYPES, default="float16", help="Storage dtype of the floating-point weights")
+    parser.add_argument("--output", help="Output path (default: <model>.fp16.safetensors / .bf16.safetensors)")
+    args = parser.parse_args()
+
+    output = args.output or converted_path(args.model, args.dtype)
+    if os.path.exists(output):
+        print(f"[ERROR] {output} already exists.")
+        sys.exit(1)
+
+    print(f"[INFO] Converting {args.model} -> {output} ({args.dtype})...")
+    before, after = convert_checkpoint(args.model, output, args.dtype)
+    print(f"[INFO] Done: {before / 1024 ** 3:.2f} GB -> {after / 1024 ** 3:.2f} GB")
+    print(f"[INFO] Set image_generation.model_id: \"{output}\" in config.yaml to use it.")
+
+if __name__ == "__main__":
+    main()
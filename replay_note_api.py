@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import argparse
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+from note_traffic import load_har, start_replay_server
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded note.com API traffic (HAR) on a local server.")
+    parser.add_argument("har", help="HAR file recorded with 'src/main.py --record-traffic' or analyze_upload.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiply recorded latencies (0 = no delay)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Extra seconds added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with --fail-status")
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible failure injection")
+    args = parser.parse_args()
+
+    entries = load_har(args.har)
+    server = start_replay_server(
+        entries,
+        host=args.host,
+        port=args.port,
+        time_scale=args.time_scale,
+        extra_latency=args.latency,
+        fail_rate=args.fail_rate,
+        fail_status=args.fail_status,
+        seed=args.seed
+    )
+    print(f"[INFO] Replaying {len(entries)} exchanges on http://{args.host}:{server.server_port}")
+    print(f"[INFO] Use NoteUploader(session_cookie='replay', base_url='http://{args.host}:{server.server_port}')")
+    print("Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n[INFO] Replay stats: {server.replay.stats}")
+
+if __name__ == "__main__":
+    main()
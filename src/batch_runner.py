@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+
+import yaml
+
+# Job states, in pipeline order; 'failed' jobs are retried from the last completed stage
+PENDING, WRITTEN, ILLUSTRATED, UPLOADED, FAILED = "pending", "written", "illustrated", "uploaded", "failed"
+
+
+def load_jobs(path):
+    """
+    Reads a batch of genre sets. Text files hold one job per line (genres separated by
+    ',' or '、', '#' starts a comment); .json/.yaml files hold a list of strings or lists.
+    Returns [{"id", "genres"}]; ids combine position and content so edited lines are new jobs.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".json", ".yaml", ".yml")):
+            items = yaml.safe_load(f) or []
+        else:
+            items = [line.split("#")[0] for line in f]
+
+    jobs = []
+    for item in items:
+        genres = item if isinstance(item, list) else item.replace("、", ",").split(",")
+        genres = [str(g).strip() for g in genres if str(g).strip()]
+        if not genres:
+            continue
+        digest = hashlib.sha1(",".join(genres).encode("utf-8")).hexdigest()[:8]
+        jobs.append({"id": f"{len(jobs):04d}-{digest}", "genres": genres})
+    return jobs
+
+
+class Checkpoint:
+    """Per-job progress persisted as JSON after every stage, so an interrupted batch resumes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.jobs = {job["id"]: job for job in json.load(f)}
+
+    def merge(self, jobs):
+        """Returns the batch's jobs with saved progress applied (jobs not in the checkpoint start pending)."""
+        merged = []
+        with self.lock:
+            for job in jobs:
+                saved = self.jobs.setdefault(job["id"], dict(job, status=PENDING))
+                merged.append(saved)
+            self._save()
+        return merged
+
+    def update(self, job, **fields):
+        with self.lock:
+            job.update(fields)
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self.jobs.values()), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class BatchRunner:
+    """
+    Producer/consumer pipeline for many articles:
+    'writers' threads generate article text, one thread renders images (so a single resident
+    pipeline is used), and 'uploaders' threads post to note.com. Stages are connected by
+    queues, so text for the next articles is written while images render and uploads run.
+
+    write(job) -> (title, body) or (None, None)
+    illustrate(job) -> {"eyecatch": path, "section_images": [...]}
+    upload(job) -> note URL or None
+    """
+
+    def __init__(self, jobs, checkpoint, write, illustrate, upload, writers=2, uploaders=2):
+        self.checkpoint = checkpoint
+        self.jobs = checkpoint.merge(jobs)
+        self.write = write
+        self.illustrate = illustrate
+        self.upload = upload
+        self.writers = max(1, writers)
+        self.uploaders = max(1, uploaders)
+        self.write_queue = queue.Queue()
+        self.image_queue = queue.Queue()
+        self.upload_queue = queue.Queue()
+        self.stop = threading.Event()
+        self.stage_seconds = {"write": [], "illustrate": [], "upload": []}
+        self.uploaded = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.start = None
+
+    def _resume_stage(self, job):
+        """Queue for a job given its saved progress (None if it is already done)."""
+        if job["status"] == UPLOADED:
+            return None
+        if job.get("illustrated"):
+            return self.upload_queue
+        if job.get("body"):
+            return self.image_queue
+        return self.write_queue
+
+    def _timed(self, stage, fn, job):
+        start = time.perf_counter()
+        try:
+            return fn(job)
+        finally:
+            with self.lock:
+                self.stage_seconds[stage].append(time.perf_counter() - start)
+
+    def _fail(self, job, stage, error):
+        print(f"[BATCH] {job['id']} failed at {stage}: {error}")
+        with self.lock:
+            self.failed += 1
+        self.checkpoint.update(job, status=FAILED, error=f"{stage}: {error}")
+
+    def _writer(self):
+        while not self.stop.is_set():
+            job = self.write_queue.get()
+            if job is None:
+                return
+            try:
+                title, body = self._timed("write", self.write, job)
+            except Exception as e:
+                self._fail(job, "write", e)
+                continue
+            if not body:
+                self._fail(job, "write", "no content generated")
+                continue
+            self.checkpoint.update(job, status=WRITTEN, title=title, body=body, error=None)
+            self.image_queue.put(job)
+
+    def _illustrator(self):
+        while not self.stop.is_set():
+            job = self.image_queue.get()
+            if job is None:
+                return
+            try:
+                images = self._timed("illustrate", self.illustrate, job)
+            except Exception as e:
+                self._fail(job, "illustrate", e)
+                continue
+            self.checkpoint.update(job, status=ILLUSTRATED, illustrated=True, error=None, **images)
+            self.upload_queue.put(job)
+
+    def _uploader(self):
+        while not self.stop.is_set():
+            job = self.upload_queue.get()
+            if job is None:
+                return
+            try:
+                url = self._timed("upload", self.upload, job)
+            except Exception as e:
+                url = None
+                print(f"[BATCH] Upload error for {job['id']}: {e}")
+            if not url:
+                self._fail(job, "upload", "upload failed")
+                continue
+            self.checkpoint.update(job, status=UPLOADED, url=url, error=None)
+            with self.lock:
+                self.uploaded += 1
+                done = sum(1 for j in self.jobs if j["status"] == UPLOADED)
+            print(f"[BATCH] {done}/{len(self.jobs)} uploaded ({job['id']}: {url}) - {self.articles_per_hour():.1f} articles/hour")
+
+    def articles_per_hour(self):
+        elapsed = time.monotonic() - self.start if self.start else 0
+        return self.uploaded / elapsed * 3600 if elapsed > 0 else 0.0
+
+    def run(self):
+        """Runs all unfinished jobs and returns the number uploaded in this run."""
+        self.start = time.monotonic()
+        todo = 0
+        for job in self.jobs:
+            stage = self._resume_stage(job)
+            if stage is not None:
+                stage.put(job)
+                todo += 1
+        print(f"[BATCH] {len(self.jobs)} jobs, {len(self.jobs) - todo} already uploaded, {todo} to run "
+              f"(writers: {self.writers}, uploaders: {self.uploaders})")
+        if not todo:
+            return 0
+
+        writers = [threading.Thread(target=self._writer, name=f"batch-writer-{i}", daemon=True) for i in range(self.writers)]
+        illustrator = threading.Thread(target=self._illustrator, name="batch-illustrator", daemon=True)
+        uploaders = [threading.Thread(target=self._uploader, name=f"batch-uploader-{i}", daemon=True) for i in range(self.uploaders)]
+        for thread in writers + [illustrator] + uploaders:
+            thread.start()
+
+        try:
+            # Each stage ends once the stage feeding it has drained
+            for _ in writers:
+                self.write_queue.put(None)
+            self._join(writers)
+            self.image_queue.put(None)
+            self._join([illustrator])
+            for _ in uploaders:
+                self.upload_queue.put(None)
+            self._join(uploaders)
+        except KeyboardInterrupt:
+            self.stop.set()
+            print("\n[BATCH] Interrupted. Progress is saved; run the same command again to resume.")
+        self.print_report()
+        return self.uploaded
+
+    @staticmethod
+    def _join(threads):
+        # Short timeouts keep the main thread responsive to Ctrl+C
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+
+    def print_report(self):
+        elapsed = time.monotonic() - self.start
+        print(f"\n[BATCH] Uploaded {self.uploaded}, failed {self.failed} in {elapsed / 60:.1f} min "
+              f"({self.articles_per_hour():.1f} articles/hour)")
+        with self.lock:
+            for stage, samples in self.stage_seconds.items():
+                if samples:
+                    print(f"  {stage:<10} n={len(samples)}, mean {sum(samples) / len(samples):.1f}s, max {max(samples):.1f}s")
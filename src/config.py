@@ -1,6 +1,9 @@
 import yaml
 import os
+import re
+import copy
 import shutil
+from datetime import datetime, timezone, timedelta
 
 CONFIG_FILE = "config.yaml"
 DEFAULT_CONFIG_FILE = "config.default.yaml"
@@ -43,3 +46,103 @@ def validate_config(config):
         print(f"[WARN] Please update {CONFIG_FILE}.")
         return False
     return True
+
+# Supported placeholders in config strings
+PLACEHOLDER_PATTERN = re.compile(r"\{(current_time)\}")
+
+def placeholder_values(now=None):
+    """
+    Returns the current values of all supported placeholders.
+    - {current_time}: Current timestamp (YYYY-MM-DD-HH-mm) in JST.
+    """
+    jst = timezone(timedelta(hours=9))
+    now = now or datetime.now(jst)
+    return {"current_time": now.astimezone(jst).strftime("%Y-%m-%d-%H-%M")}
+
+class ConfigTemplate:
+    """
+    A config tree compiled once into the locations of its placeholders.
+    render() only copies the containers on the path to a placeholder string,
+    so the rest of the tree (including large prompts without placeholders) is shared.
+    """
+    def __init__(self, config):
+        self.config = config
+        # path (tuple of keys/indices) -> string split into [literal, name, literal, ...]
+        self.templates = {}
+        self._compile(config, ())
+
+    def _compile(self, node, path):
+        if isinstance(node, dict):
+            for k, v in node.items():
+                self._compile(v, path + (k,))
+        elif isinstance(node, list):
+            for i, v in enumerate(node):
+                self._compile(v, path + (i,))
+        elif isinstance(node, str) and PLACEHOLDER_PATTERN.search(node):
+            self.templates[path] = PLACEHOLDER_PATTERN.split(node)
+
+    def render(self, values=None):
+        """Returns the config with placeholders substituted. The compiled tree is not modified."""
+        if not self.templates:
+            return self.config
+        values = values or placeholder_values()
+
+        root = copy.copy(self.config)
+        copies = {(): root}
+        for path, parts in self.templates.items():
+            node = root
+            for depth in range(1, len(path)):
+                prefix = path[:depth]
+                if prefix not in copies:
+                    copies[prefix] = copy.copy(node[path[depth - 1]])
+                    node[path[depth - 1]] = copies[prefix]
+                node = copies[prefix]
+            node[path[-1]] = "".join(
+                part if i % 2 == 0 else values[part] for i, part in enumerate(parts)
+            )
+        return root
+
+class ConfigWatcher:
+    """
+    Watches config.yaml's mtime and recompiles it when it changes,
+    so edits apply on the next cycle without restarting the process.
+    """
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self.config = load_config()
+        self.template = ConfigTemplate(self.config)
+        self.mtime = self._get_mtime()
+
+    def _get_mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def poll(self):
+        """
+        Reloads the config if the file changed. Returns True if a new config was applied.
+        An invalid file is reported and the previous config is kept.
+        """
+        mtime = self._get_mtime()
+        if mtime is None or mtime == self.mtime:
+            return False
+        self.mtime = mtime
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                config = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError) as e:
+            print(f"[WARN] Failed to reload {self.path}, keeping previous config: {e}")
+            return False
+        if not isinstance(config, dict) or not validate_config(config):
+            print(f"[WARN] Reloaded {self.path} is invalid, keeping previous config.")
+            return False
+
+        self.config = config
+        self.template = ConfigTemplate(config)
+        print(f"[INFO] {self.path} changed. New settings apply from the next cycle.")
+        return True
+
+    def render(self):
+        return self.template.render()
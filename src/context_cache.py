@@ -0,0 +1,94 @@
+import time
+import hashlib
+import threading
+from google.genai import types
+
+
+class ContextCache:
+    """
+    Holds Gemini cached-content handles for static system instructions.
+
+    One handle is kept per (model, tools) pair, since a cache is bound to a model and
+    requests using it cannot add their own tools. Handles are extended before their TTL
+    runs out and replaced when the instruction changes. If a cache cannot be created
+    (e.g. the instruction is below the model's minimum cacheable size), get() returns
+    None and the caller sends the instruction as system_instruction instead.
+    """
+
+    def __init__(self, client, ttl_seconds=3600, refresh_margin_seconds=300):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        # (model, has_tools) -> {"name", "digest", "expires"}
+        self.entries = {}
+        # (model, has_tools, digest) that failed to cache; not retried until the instruction changes
+        self.unsupported = set()
+        # One lock per key: concurrent fan-out calls must not each create a cache for it
+        self.key_locks = {}
+        self.lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def get(self, model, system_instruction, tools=None):
+        """Returns a cached-content name for this instruction, creating or refreshing it as needed."""
+        key = (model, bool(tools))
+        with self._key_lock(key):
+            return self._get(key, model, system_instruction, tools)
+
+    def _get(self, key, model, system_instruction, tools):
+        digest = hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()
+        if key + (digest,) in self.unsupported:
+            return None
+
+        entry = self.entries.get(key)
+        if entry and entry["digest"] != digest:
+            self._delete(entry)
+            entry = None
+            del self.entries[key]
+
+        now = time.monotonic()
+        if entry:
+            if entry["expires"] - now > self.refresh_margin_seconds:
+                return entry["name"]
+            if entry["expires"] > now and self._extend(entry):
+                return entry["name"]
+            del self.entries[key]
+
+        try:
+            cache = self.client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction,
+                    tools=tools,
+                    ttl=f"{self.ttl_seconds}s",
+                    display_name=f"system-prompt-{digest[:12]}"
+                )
+            )
+        except Exception as e:
+            print(f"[WARN] Context cache unavailable for {model} ({e}). Sending system_instruction instead.")
+            self.unsupported.add(key + (digest,))
+            return None
+
+        self.entries[key] = {"name": cache.name, "digest": digest, "expires": now + self.ttl_seconds}
+        print(f"[INFO] Created context cache {cache.name} for {model} (TTL {self.ttl_seconds}s)")
+        return cache.name
+
+    def _extend(self, entry):
+        try:
+            self.client.caches.update(
+                name=entry["name"],
+                config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s")
+            )
+        except Exception as e:
+            print(f"[WARN] Failed to refresh context cache {entry['name']}: {e}")
+            return False
+        entry["expires"] = time.monotonic() + self.ttl_seconds
+        return True
+
+    def _delete(self, entry):
+        try:
+            self.client.caches.delete(name=entry["name"])
+        except Exception as e:
+            print(f"[WARN] Failed to delete old context cache {entry['name']}: {e}")
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_tokens(prompt):
+    """Splits a comma-separated SD prompt into normalized keywords (weights and brackets stripped)."""
+    tokens = set()
+    for part in (prompt or "").lower().split(","):
+        token = part.strip().strip("()[]{} ")
+        if ":" in token:
+            token = token.split(":")[0].strip("() ")
+        if token:
+            tokens.add(token)
+    return tokens
+
+
+def prompt_similarity(a, b):
+    """Jaccard similarity of two prompts' keywords."""
+    ta, tb = prompt_tokens(a), prompt_tokens(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def lower_thread_priority():
+    """Lowers the calling thread's CPU priority where supported (Linux: per-thread nice)."""
+    if hasattr(os, "setpriority") and hasattr(threading, "get_native_id"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except OSError as e:
+            logger.warning(f"Failed to lower eyecatch bank priority: {e}")
+
+
+class EyecatchBank:
+    """
+    Keeps a capped bank of eyecatch images pre-rendered from the configured base prompts.
+
+    A low-priority background thread fills the bank while the scheduler is idle (not within
+    idle_margin_minutes of a scheduled slot, and not during a cycle), so a cycle can take a
+    ready image instead of rendering one on the critical path.
+    """
+
+    def __init__(self, image_generator, prompts, render_kwargs, directory=os.path.join("eyecatch", "bank"),
+                 size=3, schedule_times=None, idle_margin_minutes=30, lock=None):
+        """
+        Args:
+            image_generator: LocalImageGenerator or ImageWorkerClient.
+            prompts (list): Base prompts to render from (balanced across the bank).
+            render_kwargs (dict): negative_prompt, width, height, num_inference_steps.
+            size (int): Maximum number of images kept in the bank.
+            schedule_times (list): "HH:MM" slots; rendering stops within idle_margin_minutes before them.
+            lock (threading.Lock): Serializes use of image_generator with the cycle.
+        """
+        self.image_generator = image_generator
+        self.prompts = list(prompts or [])
+        self.render_kwargs = render_kwargs
+        self.directory = directory
+        self.size = size
+        self.schedule_times = schedule_times or []
+        self.idle_margin = timedelta(minutes=idle_margin_minutes)
+        self.lock = lock or threading.Lock()
+        self.manifest_path = os.path.join(directory, "bank.json")
+
+        self.entries = []  # {"path", "prompt", "created"}, oldest first
+        self.entries_lock = threading.Lock()
+        self.busy = threading.Event()  # set while a cycle is running
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read eyecatch bank manifest: {e}")
+            return
+        self.entries = [e for e in entries if os.path.exists(e["path"])]
+        logger.info(f"Eyecatch bank: {len(self.entries)} pre-rendered images available")
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def start(self):
+        """Starts the background producer thread."""
+        if self.thread is not None or not self.prompts:
+            return
+        self.thread = threading.Thread(target=self._run, name="eyecatch-bank", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+
+    def begin_cycle(self):
+        """
+        Stops starting new renders until end_cycle() and cancels a render in progress at its
+        next step, so the cycle does not wait for a full background render.
+        """
+        self.busy.set()
+
+    def end_cycle(self):
+        self.busy.clear()
+        self.wakeup.set()
+
+    def is_idle(self, now=None):
+        """True if no cycle is running and the next scheduled slot is beyond the idle margin."""
+        if self.busy.is_set():
+            return False
+        now = now or datetime.now()
+        for slot in self.schedule_times:
+            hour, minute = (int(v) for v in slot.split(":"))
+            next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if next_run < now:
+                next_run += timedelta(days=1)
+            if next_run - now < self.idle_margin:
+                return False
+        return True
+
+    def _next_prompt(self):
+        """Returns the base prompt with the fewest banked images, or None if there are no prompts."""
+        # Snapshot: a hot reload may replace the list while this runs
+        prompts = self.prompts
+        if not prompts:
+            return None
+        counts = {p: 0 for p in prompts}
+        with self.entries_lock:
+            for entry in self.entries:
+                if entry["prompt"] in counts:
+                    counts[entry["prompt"]] += 1
+        return min(prompts, key=lambda p: counts[p])
+
+    def _run(self):
+        lower_thread_priority()
+        loaded = False
+        while not self.stopping:
+            prompt = self._next_prompt()
+            # No prompts (emptied by a hot reload) counts as full: wait for new ones
+            if prompt is None or len(self) >= self.size or not self.is_idle():
+                if loaded:
+                    # Release model memory while the bank is full or a cycle is near
+                    with self.lock:
+                        self.image_generator.unload()
+                    loaded = False
+                self.wakeup.wait(60)
+                self.wakeup.clear()
+                continue
+
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = os.path.join(self.directory, f"bank_{timestamp}.png")
+            start = time.perf_counter()
+            with self.lock:
+                if self.busy.is_set():
+                    continue
+                if not loaded:
+                    self.image_generator.load()
+                    loaded = True
+                # 'busy' doubles as the cancel signal: begin_cycle() stops this render
+                path = self.image_generator.generate(prompt=prompt, output_path=output_path, cancel_event=self.busy,
+                                                     **self.render_kwargs)
+
+            if path:
+                with self.entries_lock:
+                    self.entries.append({"path": path, "prompt": prompt, "created": time.time()})
+                    self._save()
+                logger.info(f"Eyecatch bank: rendered {path} in {time.perf_counter() - start:.0f}s ({len(self)}/{self.size})")
+            elif self.busy.is_set():
+                logger.info("Eyecatch bank: render cancelled for a scheduled cycle")
+            else:
+                # Avoid a tight failure loop
+                self.wakeup.wait(600)
+                self.wakeup.clear()
+
+    def take(self, context_prompt=None, output_dir=None):
+        """
+        Removes and returns a banked image path, or None if the bank is empty.
+        With context_prompt, the image whose base prompt matches it best is chosen;
+        otherwise the oldest one. The file is moved to output_dir if given.
+        """
+        with self.entries_lock:
+            if not self.entries:
+                return None
+            if context_prompt:
+                entry = max(self.entries, key=lambda e: prompt_similarity(context_prompt, e["prompt"]))
+            else:
+                entry = self.entries[0]
+            self.entries.remove(entry)
+            self._save()
+        self.wakeup.set()
+
+        path = entry["path"]
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            destination = os.path.join(output_dir, os.path.basename(path))
+            shutil.move(path, destination)
+            path = destination
+        logger.info(f"Eyecatch bank: took {path} (prompt: {entry['prompt'][:60]}...)")
+        return path
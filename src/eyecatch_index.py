@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+from collections import deque
+
+import lazy_imports
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def dhash(image, size=8):
+    """Returns the 64-bit difference hash of a PIL image (perceptual, robust to resizing/recompression)."""
+    Image = lazy_imports.load("PIL.Image")
+    gray = image.convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class EyecatchIndex:
+    """
+    Persistent index of the eyecatch folder.
+
+    Each image is recorded with its dimensions, content hash, perceptual hash and last-used
+    time, plus an upload-ready variant resized to the Note.com eyecatch size. Near-duplicate
+    images are grouped into clusters, and selection rotates through clusters in
+    least-recently-used order, so picking an image is O(1) and never returns a recently
+    used or near-duplicate image while others are available.
+    """
+
+    def __init__(self, directory="eyecatch", width=1280, height=670, duplicate_distance=6):
+        """
+        Args:
+            directory (str): Folder containing the eyecatch images.
+            width (int), height (int): Size of the upload-ready variants.
+            duplicate_distance (int): Max perceptual hash distance (0-64) for two images to count as near-duplicates.
+        """
+        self.directory = directory
+        self.size = (width, height)
+        self.duplicate_distance = duplicate_distance
+        # Kept in a subfolder so that writing them does not change the folder's own mtime
+        self.cache_dir = os.path.join(directory, ".cache")
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+
+        self.entries = {}  # file name -> metadata
+        self.rotation = deque()  # clusters (lists of file names), least recently used first
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read eyecatch index {self.index_path}, rebuilding: {e}")
+            return
+        if data.get("size") != list(self.size):
+            # Variants were built for another size; rebuild them
+            return
+        self.entries = data.get("entries", {})
+        self._build_rotation()
+
+    def _save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"size": list(self.size), "entries": self.entries}, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def refresh(self):
+        """
+        Updates the index for added, changed or removed files.
+        Every file's size and mtime are compared on each call (one scandir, no reads), since a
+        file overwritten in place does not change the folder's mtime.
+        """
+        if not os.path.isdir(self.directory):
+            return
+
+        seen = set()
+        changed = False
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                name = entry.name
+                if not entry.is_file() or not name.lower().endswith(IMAGE_EXTENSIONS) or "generated" in name:
+                    continue
+                seen.add(name)
+                stat = entry.stat()
+                current = self.entries.get(name)
+                if current and current["mtime"] == stat.st_mtime and current["bytes"] == stat.st_size \
+                        and os.path.exists(current["variant"]):
+                    continue
+                indexed = self._index_file(entry.path, stat, current)
+                if indexed:
+                    self.entries[name] = indexed
+                    if current and current["variant"] != indexed["variant"]:
+                        self._remove_variant(current["variant"])
+                    changed = True
+
+        for name in set(self.entries) - seen:
+            self._remove_variant(self.entries.pop(name)["variant"])
+            changed = True
+
+        if changed:
+            logger.info(f"Eyecatch index updated: {len(self.entries)} images")
+            self._build_rotation()
+            self._save()
+
+    def _remove_variant(self, variant):
+        """Deletes an upload variant no indexed image uses any more."""
+        if os.path.exists(variant) and not any(e["variant"] == variant for e in self.entries.values()):
+            os.remove(variant)
+
+    def _index_file(self, path, stat, previous=None):
+        Image = lazy_imports.load("PIL.Image")
+        ImageOps = lazy_imports.load("PIL.ImageOps")
+        try:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            with Image.open(path) as image:
+                image.load()
+                width, height = image.size
+                phash = dhash(image)
+
+                os.makedirs(self.cache_dir, exist_ok=True)
+                variant = os.path.join(self.cache_dir, f"{digest[:16]}_{self.size[0]}x{self.size[1]}.jpg")
+                if not os.path.exists(variant):
+                    fitted = ImageOps.fit(image.convert("RGB"), self.size, Image.LANCZOS)
+                    fitted.save(variant, format="JPEG", quality=90)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable eyecatch image {path}: {e}")
+            return None
+
+        return {
+            "mtime": stat.st_mtime,
+            "bytes": stat.st_size,
+            "width": width,
+            "height": height,
+            "sha256": digest,
+            "phash": f"{phash:016x}",
+            "variant": variant,
+            "last_used": previous.get("last_used", 0) if previous else 0,
+        }
+
+    def _build_rotation(self):
+        """Groups near-duplicates into clusters and orders them by last use (never-used ones shuffled first)."""
+        names = list(self.entries)
+        hashes = {name: int(self.entries[name]["phash"], 16) for name in names}
+
+        # Union-find over pairs within duplicate_distance (identical content always merges)
+        parent = {name: name for name in names}
+
+        def find(name):
+            while parent[name] != name:
+                parent[name] = parent[parent[name]]
+                name = parent[name]
+            return name
+
+        for i, a in enumerate(names):
+            for b in names[i + 1:]:
+                if self.entries[a]["sha256"] == self.entries[b]["sha256"] or \
+                        hamming(hashes[a], hashes[b]) <= self.duplicate_distance:
+                    parent[find(a)] = find(b)
+
+        clusters = {}
+        for name in names:
+            clusters.setdefault(find(name), []).append(name)
+
+        groups = list(clusters.values())
+        random.shuffle(groups)
+        groups.sort(key=lambda group: max(self.entries[n]["last_used"] for n in group))
+        self.rotation = deque(groups)
+
+    def select(self):
+        """
+        Returns the upload-ready path of the least recently used image cluster's
+        least recently used member, or None if the folder has no images.
+        """
+        if not self.rotation:
+            return None
+
+        group = self.rotation.popleft()
+        self.rotation.append(group)
+        name = min(group, key=lambda n: self.entries[n]["last_used"])
+        entry = self.entries[name]
+        entry["last_used"] = time.time()
+        self._save()
+        logger.info(f"Selected eyecatch {name} ({entry['width']}x{entry['height']})")
+        return entry["variant"]
@@ -0,0 +1,191 @@
+import re
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+
+# HTTP status codes worth retrying: rate limit, timeouts and transient server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Exception class names of transport-level failures (requests/httpx/builtin), matched by name
+# so that no HTTP library has to be imported here
+RETRYABLE_ERRORS = {"ConnectionError", "TimeoutError", "ConnectTimeout", "ReadTimeout", "RemoteProtocolError",
+                    "ConnectError", "ReadError", "WriteError", "PoolTimeout", "ChunkedEncodingError"}
+RETRY_DELAY_PATTERN = re.compile(r"retryDelay'?\"?\s*:\s*'?\"?(\d+(?:\.\d+)?)s")
+
+
+def classify_error(error):
+    """
+    Returns a short reason if the error is transient and the call should be retried,
+    or None if retrying cannot help (bad request, auth, safety block, ...).
+    """
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        if status in RETRYABLE_STATUS:
+            return f"HTTP {status}"
+        return None
+    for cls in type(error).__mro__:
+        if cls.__name__ in RETRYABLE_ERRORS:
+            return cls.__name__
+    return None
+
+
+def retry_after_seconds(error):
+    """Returns the server-suggested delay of a 429 (RetryInfo.retryDelay), if present."""
+    match = RETRY_DELAY_PATTERN.search(str(getattr(error, "details", None) or error))
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: 'rate_per_minute' requests on average, bursts up to 'burst'.
+    """
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(rate_per_minute // 6)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Takes a token if one is available right now."""
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Blocks until a token is available. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ResilientCaller:
+    """
+    Runs Gemini calls under a client-side rate limit, retries transient failures
+    (429/5xx/connection errors) with jittered exponential backoff, and optionally hedges:
+    if a call has not answered after the observed latency percentile for its
+    (model, call type), a duplicate is sent and whichever succeeds first is used.
+    The losing request is not cancelled (its result is discarded), so hedging trades
+    some extra requests for a shorter tail.
+    """
+
+    def __init__(self, settings=None, tracker=None):
+        self.tracker = tracker
+        self.executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini")
+        self.stats = {"calls": 0, "retries": 0, "gave_up": 0, "hedges": 0, "hedge_wins": 0, "throttled_seconds": 0.0}
+        self.retry_reasons = {}
+        self.lock = threading.Lock()
+        self.configure(settings)
+
+    def configure(self, settings):
+        """Applies (or re-applies after a config reload) the 'gemini_client' settings."""
+        settings = settings or {}
+        rate = settings.get('requests_per_minute')
+        self.bucket = TokenBucket(rate, settings.get('burst')) if rate else None
+        self.max_retries = settings.get('max_retries', 4)
+        self.base_delay = settings.get('base_delay_seconds', 2.0)
+        self.max_delay = settings.get('max_delay_seconds', 60.0)
+        hedge = settings.get('hedge', {}) or {}
+        self.hedge_enabled = hedge.get('enabled', False)
+        self.hedge_percentile = hedge.get('percentile', 95)
+        self.hedge_min_samples = hedge.get('min_samples', 5)
+        self.hedge_call_types = hedge.get('call_types') or None
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def _acquire(self):
+        if self.bucket is not None:
+            waited = self.bucket.acquire()
+            if waited:
+                self._count("throttled_seconds", waited)
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        hint = retry_after_seconds(error)
+        return max(delay, min(hint, self.max_delay)) if hint else delay
+
+    def call(self, fn, call_type, model):
+        """Runs fn() (one generate_content attempt) with rate limiting, retries and hedging."""
+        self._count("calls")
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                return self._hedged(fn, call_type, model)
+            except Exception as e:
+                reason = classify_error(e)
+                if reason is None:
+                    raise
+                if attempt >= self.max_retries:
+                    self._count("gave_up")
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                with self.lock:
+                    self.stats["retries"] += 1
+                    self.retry_reasons[reason] = self.retry_reasons.get(reason, 0) + 1
+                print(f"[RETRY] {call_type} ({model}): {reason}, retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _hedge_delay(self, call_type, model):
+        if not self.hedge_enabled or self.tracker is None:
+            return None
+        if self.hedge_call_types and call_type not in self.hedge_call_types:
+            return None
+        if self.tracker.count(model, call_type) < self.hedge_min_samples:
+            return None
+        return self.tracker.percentile(model, call_type, self.hedge_percentile)
+
+    def _hedged(self, fn, call_type, model):
+        delay = self._hedge_delay(call_type, model)
+        if delay is None:
+            return fn()
+
+        primary = self.executor.submit(fn)
+        done, _ = wait([primary], timeout=delay)
+        # No hedge if the primary answered in time, or if the rate limit has no spare request
+        if done or (self.bucket is not None and not self.bucket.try_acquire()):
+            return primary.result()
+
+        self._count("hedges")
+        print(f"[HEDGE] {call_type} ({model}): no answer after p{self.hedge_percentile} {delay:.1f}s, sending a duplicate")
+        hedge = self.executor.submit(fn)
+        error = None
+        for future in as_completed([primary, hedge]):
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if future is hedge:
+                self._count("hedge_wins")
+            return result
+        raise error
+
+    def summary(self):
+        """Returns a printable line with the retry/hedge counters."""
+        with self.lock:
+            stats = dict(self.stats)
+            reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(self.retry_reasons.items()))
+        return (
+            f"calls {stats['calls']}, retries {stats['retries']}{f' ({reasons})' if reasons else ''}, "
+            f"gave up {stats['gave_up']}, hedges {stats['hedges']} (won {stats['hedge_wins']}), "
+            f"throttled {stats['throttled_seconds']:.1f}s"
+        )
@@ -1,15 +1,113 @@
+import json
+import time
+from model_router import ModelRouter
+from context_cache import ContextCache
+from gemini_client import ResilientCaller
+from config import PLACEHOLDER_PATTERN, placeholder_values
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google import genai
 from google.genai import types
 
-from google import genai
-from google.genai import types
+IMAGE_PROMPT_INSTRUCTION = """
+記事の内容を元に、AI画像生成(Stable Diffusion)のための英語のプロンプトを作成してください。
+
+【指示】
+- 記事のトピックを象徴する、抽象的または具体的なシーンを描写してください。
+- 英語で出力してください。
+- カンマ区切りのキーワード羅列形式で出力してください。
+- 余計な説明や「Here is the prompt:」などの前置きは一切不要です。プロンプトのみを出力してください。
+- 例: futuristic city, cyberpunk, neon lights, high quality, 4k, detailed
+"""
 
 class GeminiGenerator:
-    def __init__(self, api_key, model_name, system_prompt, use_search=True):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(self, api_key, model_name, system_prompt, use_search=True, routing=None, context_cache=None,
+                 gemini_client=None, client=None):
+        """
+        Args:
+            system_prompt (str): Static instructions, sent as system_instruction. Placeholders such as
+                {current_time} are left in place and their values are sent with each request.
+            context_cache (dict): 'context_cache' settings; if enabled, the system prompt is held in a
+                Gemini cached-content handle instead of being re-sent every call.
+            gemini_client (dict): 'gemini_client' settings (rate limit, retries, hedged requests).
+            client: Optional pre-built genai client (e.g. a stub in tests).
+        """
+        self.client = client or genai.Client(api_key=api_key)
         self.model_name = model_name
         self.system_prompt = system_prompt
         self.use_search = use_search
+        self.router = ModelRouter(routing)
+        self.caller = ResilientCaller(gemini_client, tracker=self.router.tracker)
+        self.context_cache = None
+        context_cache = context_cache or {}
+        if context_cache.get('enabled', False):
+            self.context_cache = ContextCache(
+                self.client,
+                ttl_seconds=context_cache.get('ttl_seconds', 3600),
+                refresh_margin_seconds=context_cache.get('refresh_margin_seconds', 300)
+            )
+
+    def begin_cycle(self):
+        """Starts a new per-cycle latency budget for model routing."""
+        self.router.begin_cycle()
+
+    def _placeholder_values_text(self):
+        """
+        Returns the per-cycle values of placeholders used in the system prompt, to be sent
+        with the request so the system prompt itself stays static (and cacheable).
+        """
+        names = sorted(set(PLACEHOLDER_PATTERN.findall(self.system_prompt or "")))
+        if not names:
+            return ""
+        values = placeholder_values()
+        lines = "\n".join(f"- {{{name}}}: {values[name]}" for name in names)
+        return f"\n\n【指示内のプレースホルダーの値】\n{lines}\n"
+
+    def _generate(self, call_type, contents, system_instruction=None, tools=None, use_cache=False, **config_kwargs):
+        """
+        Calls generate_content on the model chosen by the router for this call type,
+        recording latency and token usage from the response metadata. Each attempt
+        (retries and hedged duplicates included) goes through the rate limit and is recorded.
+
+        The static system_instruction (and tools) go into a cached-content handle when
+        use_cache is set and context caching is enabled, otherwise into the request config.
+        """
+        model = self.router.route(call_type, self.model_name)
+        cached_content = None
+        if use_cache and self.context_cache is not None and system_instruction:
+            cached_content = self.context_cache.get(model, system_instruction, tools)
+        if cached_content:
+            config = types.GenerateContentConfig(cached_content=cached_content, **config_kwargs)
+        else:
+            config = types.GenerateContentConfig(system_instruction=system_instruction, tools=tools, **config_kwargs)
+
+        def attempt():
+            start = time.perf_counter()
+            try:
+                response = self.client.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config
+                )
+            except Exception:
+                self.router.tracker.record(model, call_type, time.perf_counter() - start, ok=False)
+                raise
+            self.router.tracker.record(model, call_type, time.perf_counter() - start, getattr(response, "usage_metadata", None))
+            return response
+
+        return self.caller.call(attempt, call_type, model)
+
+    def check_auth(self):
+        """
+        Verifies the API key and model name with a lightweight metadata request.
+        """
+        try:
+            model = self.client.models.get(model=self.model_name)
+            print(f"[SUCCESS] Gemini API key OK (Model: {model.name})")
+            return True
+        except Exception as e:
+            print(f"[ERROR] Gemini auth check failed: {e}")
+            return False
 
     def generate_article(self, genres):
         """
@@ -18,28 +116,24 @@ class GeminiGenerator:
         if self.use_search:
             print("[INFO] Generating report with Gemini Grounding...")
             prompt = f"""
-            今日の {", ".join(genres)} に関する最新ニュースを検索し、以下の指示に従ってレポートを作成してください。
-            
-            {self.system_prompt}
+            今日の {", ".join(genres)} に関する最新ニュースを検索し、システム指示に従ってレポートを作成してください。
             """
             tools = [types.Tool(google_search=types.GoogleSearch())]
         else:
             print("[INFO] Generating report (No Search)...")
             prompt = f"""
-            以下の指示に従って記事を作成してください。
+            システム指示に従って記事を作成してください。
             テーマ: {", ".join(genres)}
-            
-            {self.system_prompt}
             """
             tools = None
 
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    tools=tools
-                )
+            response = self._generate(
+                "article",
+                contents=prompt + self._placeholder_values_text(),
+                system_instruction=self.system_prompt,
+                tools=tools,
+                use_cache=True
             )
             
             if response.text:
@@ -52,29 +146,147 @@ class GeminiGenerator:
             print(f"[ERROR] Generation failed: {e}")
             return None
 
+    def generate_genre_sections(self, genres):
+        """
+        Generates only the news sections (### headings) for a subset of genres.
+        Used by generate_article_fanout; returns None on failure.
+        """
+        prompt = f"""
+        今日の {", ".join(genres)} に関する最新ニュースを{'検索し' if self.use_search else '取り上げ'}、システム指示の記事構成のうち「各ニュースの要約」部分だけを作成してください。
+
+        【出力ルール】
+        - ジャンルごとに1〜2件のニュースを、見出し (###)・内容・出典/リンク (あれば) の形式で書いてください。
+        - タイトル、導入文、まとめ、ハッシュタグは書かないでください (別途まとめて作成します)。
+        - 前置きや返事は一切不要です。いきなり最初の見出しから書き始めてください。
+        """
+        tools = [types.Tool(google_search=types.GoogleSearch())] if self.use_search else None
+
+        try:
+            response = self._generate(
+                "article_section",
+                contents=prompt + self._placeholder_values_text(),
+                system_instruction=self.system_prompt,
+                tools=tools,
+                use_cache=True
+            )
+            return response.text.strip() if response.text else None
+        except Exception as e:
+            print(f"[ERROR] Section generation failed for {genres}: {e}")
+            return None
+
+    def merge_sections(self, genres, sections):
+        """
+        Asks the model for the title, lead, closing and hashtags around already written sections
+        (a short call without search). Returns a dict, or None on failure.
+        """
+        headings = [line.strip() for line in "\n".join(sections).splitlines() if line.strip().startswith("#")]
+        prompt = f"""
+        システム指示に従ったニュースダイジェスト記事のうち、各ニュースの要約はすでに作成済みです。
+        残りの部分 (タイトル、導入文、まとめ/編集後記、ハッシュタグ) だけを作成してください。
+
+        【対象ジャンル】
+        {", ".join(genres)}
+
+        【作成済みニュースの見出し】
+        {chr(10).join(headings)}
+
+        【出力形式】
+        次のキーを持つJSONのみを出力してください:
+        {{"title": "1行目に置くタイトル行", "lead": "導入文 (Markdown)", "closing": "まとめ/編集後記 (Markdown)", "hashtags": ["#タグ", ...]}}
+        """ + self._placeholder_values_text()
+
+        try:
+            response = self._generate(
+                "merge",
+                contents=prompt,
+                system_instruction=self.system_prompt,
+                use_cache=True,
+                response_mime_type="application/json"
+            )
+            data = json.loads(response.text)
+            if not isinstance(data, dict) or not data.get("title"):
+                print(f"[WARN] Unexpected merge response: {response.text[:200]}")
+                return None
+            return data
+        except Exception as e:
+            print(f"[WARN] Merge call failed: {e}")
+            return None
+
+    @staticmethod
+    def assemble_article(genres, sections, parts=None):
+        """
+        Assembles the final Markdown report. Without model-written parts, a local template is used.
+        """
+        if parts is None:
+            parts = {
+                "title": f"{datetime.now().strftime('%Y-%m-%d')} ニューストピック レポート",
+                "lead": f"今日の {', '.join(genres)} の注目ニュースをまとめてお届けします。",
+                "closing": "## まとめ\n以上、今日の注目ニュースでした。",
+                "hashtags": ["#ニュース"] + ["#" + g.replace("・", "").replace(" ", "") for g in genres],
+            }
+        hashtags = " ".join(tag if tag.startswith("#") else f"#{tag}" for tag in parts.get("hashtags", []))
+        blocks = [parts["title"], parts.get("lead", ""), *sections, parts.get("closing", ""), hashtags]
+        return "\n\n".join(block.strip() for block in blocks if block and block.strip())
+
+    def generate_article_fanout(self, genres, max_concurrency=3, genres_per_call=1, merge="model"):
+        """
+        Generates the report with one grounded call per genre group, run concurrently,
+        then assembles the sections with a short merge call (merge="model") or a local template.
+        Wall-clock time is bounded by the slowest group instead of one long generation.
+        """
+        genres_per_call = max(1, genres_per_call)
+        groups = [genres[i:i + genres_per_call] for i in range(0, len(genres), genres_per_call)]
+        print(f"[INFO] Generating report sections for {len(groups)} genre groups (concurrency: {max_concurrency})...")
+
+        start = time.perf_counter()
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = {executor.submit(self._timed_sections, group): i for i, group in enumerate(groups)}
+            for future in as_completed(futures):
+                index = futures[future]
+                text, elapsed = future.result()
+                print(f"[INFO]   {', '.join(groups[index])}: {'ok' if text else 'failed'} ({elapsed:.1f}s)")
+                if text:
+                    results[index] = text
+
+        if not results:
+            print("[ERROR] No sections generated.")
+            return None
+
+        # Keep the configured genre order
+        sections = [results[i] for i in sorted(results)]
+        covered = [g for i in sorted(results) for g in groups[i]]
+
+        parts = None
+        if merge == "model":
+            parts = self.merge_sections(covered, sections)
+            if parts is None:
+                print("[WARN] Falling back to local template for title/lead/closing.")
+
+        article = self.assemble_article(covered, sections, parts)
+        print(f"[INFO] Fan-out report generated in {time.perf_counter() - start:.1f}s")
+        return article
+
+    def _timed_sections(self, group):
+        start = time.perf_counter()
+        text = self.generate_genre_sections(group)
+        return text, time.perf_counter() - start
+
     def generate_image_prompt(self, article_content):
         """
         Generates a prompt for Stable Diffusion based on the article content.
         """
         print("[INFO] Generating image prompt...")
         prompt = f"""
-        以下の記事の内容を元に、AI画像生成(Stable Diffusion)のための英語のプロンプトを作成してください。
-        
         【記事内容】
         {article_content[:1000]}... (省略)
-        
-        【指示】
-        - 記事のトピックを象徴する、抽象的または具体的なシーンを描写してください。
-        - 英語で出力してください。
-        - カンマ区切りのキーワード羅列形式で出力してください。
-        - 余計な説明や「Here is the prompt:」などの前置きは一切不要です。プロンプトのみを出力してください。
-        - 例: futuristic city, cyberpunk, neon lights, high quality, 4k, detailed
         """
         
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
+            response = self._generate(
+                "image_prompt",
+                contents=prompt,
+                system_instruction=IMAGE_PROMPT_INSTRUCTION
             )
             
             if response.text:
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def cache_key(**params):
+    """
+    Returns the content address of a render request.
+    All parameters that affect the output (prompt, negative prompt, model, scheduler,
+    steps, size, seed) must be included; None values are kept so they stay distinct.
+    """
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """
+    Content-addressed cache of generated images with a disk-size-capped LRU policy.
+
+    Images are stored as <key>.png. Other image files already in the directory (older
+    timestamp-named renders, images taken from the bank) are adopted on startup with their
+    mtime as last access, so the whole directory stays within max_bytes.
+    """
+
+    def __init__(self, directory=os.path.join("eyecatch", "generated"), max_bytes=500 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, "cache_index.json")
+        self.entries = {}  # file name -> {"bytes", "last_access", "params"}
+        self.lock = threading.Lock()
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-cache")
+        self.pending = {}  # file name -> Future of a write still in progress
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to read image cache index, rebuilding: {e}")
+                self.entries = {}
+
+        if not os.path.isdir(self.directory):
+            return
+        present = set()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            present.add(name)
+            if name not in self.entries:
+                self.entries[name] = {"bytes": os.path.getsize(path), "last_access": os.path.getmtime(path), "params": None}
+        for name in set(self.entries) - present:
+            del self.entries[name]
+        self._evict()
+        self._save()
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def path_for(self, key):
+        """Returns the path where the image for this key is (or will be) stored."""
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """Returns the cached image path for this key and marks it as used, or None on a miss."""
+        name = f"{key}.png"
+        path = self.path_for(key)
+        self._wait(name)
+        with self.lock:
+            if name not in self.entries or not os.path.exists(path):
+                self.entries.pop(name, None)
+                return None
+            self.entries[name]["last_access"] = time.time()
+            self._save()
+        return path
+
+    def add(self, key, params=None):
+        """Registers the image written at path_for(key) and evicts old entries beyond max_bytes."""
+        name = f"{key}.png"
+        path = self.path_for(key)
+        with self.lock:
+            self.entries[name] = {"bytes": os.path.getsize(path), "last_access": time.time(), "params": params}
+            self._evict(keep=name)
+            self._save()
+
+    def store(self, key, data, params=None, name=None):
+        """
+        Writes encoded image bytes for this key in the background and registers them once
+        written, so the caller can hand the bytes on (e.g. upload them) without waiting for
+        disk. 'name' overrides the file name (params are then not recorded). Returns the path.
+        """
+        name = name or f"{key}.png"
+        path = os.path.join(self.directory, name)
+        with self.lock:
+            self.pending[name] = self.writer.submit(self._write, name, path, data, params if name == f"{key}.png" else None)
+        return path
+
+    def _write(self, name, path, data, params):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self.lock:
+                self.entries[name] = {"bytes": len(data), "last_access": time.time(), "params": params}
+                self._evict(keep=name)
+                self._save()
+            logger.info(f"Image saved to {path}")
+        except OSError as e:
+            logger.warning(f"Image cache: failed to write {path}: {e}")
+        finally:
+            with self.lock:
+                self.pending.pop(name, None)
+
+    def _wait(self, name):
+        with self.lock:
+            future = self.pending.get(name)
+        if future is not None:
+            future.result()
+
+    def flush(self):
+        """Waits for all background writes to finish."""
+        with self.lock:
+            futures = list(self.pending.values())
+        for future in futures:
+            future.result()
+
+    def find_source(self, base_prompt, **match):
+        """
+        Returns (key, path) of the least recently used full text-to-image render whose prompt
+        starts with base_prompt and whose params equal 'match' (e.g. model_id, width, height),
+        and marks it as used; None if there is none. Used as the start image of img2img refreshes.
+        """
+        with self.lock:
+            candidates = []
+            for name, entry in self.entries.items():
+                params = entry.get("params")
+                if not params or params.get("init") or name in self.pending:
+                    continue
+                prompt = params.get("prompt") or ""
+                if prompt != base_prompt and not prompt.startswith(f"{base_prompt}, "):
+                    continue
+                if any(params.get(field) != value for field, value in match.items()):
+                    continue
+                candidates.append((entry["last_access"], name))
+        for _, name in sorted(candidates):
+            key = name[:-len(".png")]
+            path = self.get(key)
+            if path:
+                return key, path
+        return None
+
+    def adopt(self, path):
+        """Registers an image moved into the cache directory from elsewhere (e.g. the bank)."""
+        name = os.path.basename(path)
+        with self.lock:
+            self.entries[name] = {"bytes": os.path.getsize(path), "last_access": time.time(), "params": None}
+            self._evict(keep=name)
+            self._save()
+
+    def total_bytes(self):
+        return sum(entry["bytes"] for entry in self.entries.values())
+
+    def _evict(self, keep=None):
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        for name, entry in sorted(self.entries.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= entry["bytes"]
+            del self.entries[name]
+            logger.info(f"Image cache: evicted {name}")
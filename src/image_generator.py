@@ -1,23 +1,38 @@
+import io
 import os
-import torch
-from diffusers import (
-    StableDiffusionPipeline,
-    StableDiffusionXLPipeline,
-    EulerAncestralDiscreteScheduler, 
-    EulerDiscreteScheduler, 
-    DPMSolverMultistepScheduler, 
-    DDIMScheduler
-)
+import time
 import logging
 import gc
+import json
 import traceback
+import thread_tuning
+import weight_formats
+from unet_cache import UNetFeatureCache
+import lazy_imports
+
+# torch/diffusers are imported on first load() so that importing this module stays cheap
+torch = None
+diffusers = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class RenderCancelled(Exception):
+    """Raised from the step callback when a render would overrun its time budget."""
+
+
+def _import_ml_stack():
+    """Imports torch and diffusers on first use."""
+    global torch, diffusers
+    if torch is None:
+        torch = lazy_imports.load("torch")
+        diffusers = lazy_imports.load("diffusers")
+
+
 class LocalImageGenerator:
-    def __init__(self, model_id="runwayml/stable-diffusion-v1-5", device="cpu", scheduler_name="Euler a", safety_checker=None):
+    def __init__(self, model_id="runwayml/stable-diffusion-v1-5", device="cpu", scheduler_name="Euler a", safety_checker=None, threads=None, weights=None, unet_cache=None,
+                 residency="full"):
         """
         Initializes the LocalImageGenerator.
         
@@ -26,26 +41,66 @@ class LocalImageGenerator:
             device (str): Device to run on ('cpu' or 'cuda'). Default is 'cpu' for N100.
             scheduler_name (str): Name of the scheduler to use.
             safety_checker (bool): Whether to use the safety checker. Default None (auto-disable if possible to save RAM).
+            threads (dict): CPU thread settings (intra_op, inter_op, affinity, auto_tune). See config.default.yaml.
+            weights (dict): CPU precision settings (dtype: float32/bfloat16/float16, quantize: None/"int8").
+            unet_cache (dict): Cross-step UNet feature caching (enabled, interval). See unet_cache.py.
+            residency (str): "full" keeps the whole pipeline loaded. "staged" loads the text encoders,
+                the UNet and the VAE one after another for each render, so peak RAM is about the
+                largest single component.
         """
         self.device = device
         self.model_id = model_id
         self.scheduler_name = scheduler_name
+        # Scheduler the loaded pipeline uses; render() switches it when scheduler_name changes
+        self.applied_scheduler = None
         self.safety_checker = safety_checker
+        self.threads = threads or {}
+        self.weights = weight_formats.validate_weights(device, weights)
+        self.unet_cache = unet_cache or {}
+        self.feature_cache = None
+        self.residency = residency
+        # Diffusers-format folder the staged mode loads components from (set by load())
+        self.components_dir = None
+        self.affinity = None
         self.pipe = None
+        # Keep the pipeline loaded after generate*() calls that loaded it (see main.hold_pipeline)
+        self.keep_alive = False
+        # Number of load() calls that actually loaded (lets a caller see whether it caused a load)
+        self.load_count = 0
+        # Image-to-image view of self.pipe sharing its components (created on first use)
+        self.img2img_pipe = None
+        # Seconds per step per megapixel observed in this process (None until the first render)
+        self.step_rate = None
+        # Progress of the last render: steps_done, total_steps, elapsed, seconds_per_step, status
+        self.last_render = None
         
         logger.info(f"Initialized LocalImageGenerator config with model: {model_id}, scheduler: {scheduler_name} on {device}")
         # Pipeline is NOT loaded here to save memory. Call load() before use.
 
+    def is_loaded(self):
+        return self.pipe is not None or self.components_dir is not None
+
     def load(self):
-        """Loads the pipeline into memory."""
-        if self.pipe is not None:
+        """Loads the pipeline into memory (staged mode: prepares the per-component folders)."""
+        if self.is_loaded():
             logger.info("Pipeline already loaded.")
             return
+        self.load_count += 1
+
+        if self.residency == "staged":
+            _import_ml_stack()
+            self.components_dir = self._prepare_components()
+            if self.device == "cpu":
+                self._configure_threads(allow_tune=False)
+            logger.info(f"Staged residency: components are loaded per render from {self.components_dir}")
+            return
 
         logger.info(f"Loading pipeline for {self.model_id}...")
         try:
-            # Determine dtype based on device
-            torch_dtype = torch.float16 if self.device == "cuda" else torch.float32
+            _import_ml_stack()
+
+            # Determine dtype based on device (and weights.dtype on CPU)
+            torch_dtype = weight_formats.compute_dtype(torch, self.device, self.weights)
             
             # Prepare kwargs
             kwargs = {
@@ -64,12 +119,12 @@ class LocalImageGenerator:
             try:
                 logger.info("Attempting to load as SDXL pipeline...")
                 if os.path.isfile(self.model_id) or self.model_id.endswith((".safetensors", ".ckpt")):
-                    self.pipe = StableDiffusionXLPipeline.from_single_file(
+                    self.pipe = diffusers.StableDiffusionXLPipeline.from_single_file(
                         self.model_id,
                         **kwargs
                     )
                 else:
-                    self.pipe = StableDiffusionXLPipeline.from_pretrained(
+                    self.pipe = diffusers.StableDiffusionXLPipeline.from_pretrained(
                         self.model_id,
                         **kwargs
                     )
@@ -79,12 +134,12 @@ class LocalImageGenerator:
                 logger.info("Falling back to Standard Stable Diffusion (v1.5/2.1) pipeline...")
                 
                 if os.path.isfile(self.model_id) or self.model_id.endswith((".safetensors", ".ckpt")):
-                    self.pipe = StableDiffusionPipeline.from_single_file(
+                    self.pipe = diffusers.StableDiffusionPipeline.from_single_file(
                         self.model_id,
                         **kwargs
                     )
                 else:
-                    self.pipe = StableDiffusionPipeline.from_pretrained(
+                    self.pipe = diffusers.StableDiffusionPipeline.from_pretrained(
                         self.model_id,
                         **kwargs
                     )
@@ -93,12 +148,19 @@ class LocalImageGenerator:
             # Set Scheduler
             self._set_scheduler()
 
+            if self.unet_cache.get('enabled', False):
+                self.feature_cache = UNetFeatureCache(self.pipe.unet, interval=self.unet_cache.get('interval', 3))
+                self.feature_cache.enable()
+
             self.pipe.to(self.device)
             
             # Optimization for CPU/Low RAM
             if self.device == "cpu":
                 logger.info("Applying CPU optimizations (enable_attention_slicing)...")
                 self.pipe.enable_attention_slicing()
+                if self.weights.get('quantize') == 'int8':
+                    weight_formats.quantize_linear_int8(torch, self.pipe)
+                self._configure_threads()
             elif self.device == "cuda":
                 logger.info("Applying GPU optimizations...")
                 # Optional: enable_xformers_memory_efficient_attention() if xformers is installed
@@ -112,36 +174,191 @@ class LocalImageGenerator:
             logger.error(traceback.format_exc())
             raise e
 
+    def _configure_threads(self, allow_tune=True):
+        """
+        Applies the torch thread layout for CPU inference.
+        'intra_op: auto' uses the layout saved for this host, auto-tuning it on the first run
+        (tuning needs the full pipeline, so it is not run when allow_tune is False).
+        """
+        intra_op = self.threads.get('intra_op', 'auto')
+        inter_op = self.threads.get('inter_op')
+        affinity = self.threads.get('affinity') or None
+
+        if intra_op == 'auto':
+            layout = thread_tuning.load_tuning()
+            if layout is None and allow_tune and self.threads.get('auto_tune', True):
+                layout = thread_tuning.auto_tune(torch, self.pipe, cpus=affinity, inter_op=inter_op)
+            if layout:
+                thread_tuning.apply_threads(torch, layout.get('intra_op'), inter_op or layout.get('inter_op'))
+                affinity = affinity or layout.get('affinity')
+        else:
+            thread_tuning.apply_threads(torch, intra_op, inter_op)
+
+        self.affinity = affinity
+
     def _set_scheduler(self):
         """Configures the scheduler based on the name."""
         if not self.pipe:
             return
+        # The img2img view keeps the scheduler it was created with; rebuild it on next use
+        self.img2img_pipe = None
 
         try:
             config = self.pipe.scheduler.config
             if self.scheduler_name == "Euler a":
-                self.pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(config)
+                self.pipe.scheduler = diffusers.EulerAncestralDiscreteScheduler.from_config(config)
             elif self.scheduler_name == "Euler":
-                self.pipe.scheduler = EulerDiscreteScheduler.from_config(config)
+                self.pipe.scheduler = diffusers.EulerDiscreteScheduler.from_config(config)
             elif self.scheduler_name == "DPM++ 2M Karras":
-                self.pipe.scheduler = DPMSolverMultistepScheduler.from_config(config, use_karras_sigmas=True)
+                self.pipe.scheduler = diffusers.DPMSolverMultistepScheduler.from_config(config, use_karras_sigmas=True)
             elif self.scheduler_name == "DPM++ SDE Karras":
-                self.pipe.scheduler = DPMSolverMultistepScheduler.from_config(config, use_karras_sigmas=True, algorithm_type="sde-dpmsolver++")
+                self.pipe.scheduler = diffusers.DPMSolverMultistepScheduler.from_config(config, use_karras_sigmas=True, algorithm_type="sde-dpmsolver++")
             elif self.scheduler_name == "DDIM":
-                self.pipe.scheduler = DDIMScheduler.from_config(config)
+                self.pipe.scheduler = diffusers.DDIMScheduler.from_config(config)
             else:
                 logger.warning(f"Unknown scheduler '{self.scheduler_name}', using default.")
             
+            self.applied_scheduler = self.scheduler_name
             logger.info(f"Scheduler set to: {self.scheduler_name}")
         except Exception as e:
             logger.error(f"Failed to set scheduler: {e}")
 
+    def _prepare_components(self):
+        """
+        Returns a Diffusers-format folder with one subfolder per component.
+        A single-file checkpoint is split once into models/components/<name>-<dtype>
+        (with a full load); folders and Hugging Face IDs are used as they are.
+        """
+        if not (os.path.isfile(self.model_id) or self.model_id.endswith((".safetensors", ".ckpt"))):
+            return self.model_id
+
+        dtype_name = str(weight_formats.compute_dtype(torch, self.device, self.weights)).replace("torch.", "")
+        stem = os.path.splitext(os.path.basename(self.model_id))[0]
+        directory = os.path.join("models", "components", f"{stem}-{dtype_name}")
+        if not os.path.exists(os.path.join(directory, "model_index.json")):
+            logger.info(f"Splitting {self.model_id} into per-component folders at {directory} (one-time)...")
+            # Save plain weights: _staged_call quantizes and patches each stage itself, and the
+            # split does not need thread auto-tuning
+            settings = (self.weights, self.unet_cache, self.threads)
+            self.weights = dict(self.weights, quantize=None)
+            self.unet_cache = {}
+            self.threads = dict(self.threads, auto_tune=False)
+            self.residency = "full"
+            try:
+                self.load()
+                self.pipe.save_pretrained(directory, safe_serialization=True)
+            finally:
+                self.unload()
+                self.residency = "staged"
+                self.weights, self.unet_cache, self.threads = settings
+        return directory
+
+    def _stage_pipeline(self, keep):
+        """
+        Loads the pipeline with only the named components; the others are passed as None.
+        Weights come from memory-mapped safetensors files (low_cpu_mem_usage).
+        """
+        if os.path.isdir(self.components_dir):
+            with open(os.path.join(self.components_dir, "model_index.json"), "r", encoding="utf-8") as f:
+                model_index = json.load(f)
+        else:
+            model_index = diffusers.DiffusionPipeline.load_config(self.components_dir)
+        pipeline_class = getattr(diffusers, model_index["_class_name"])
+        skipped = {
+            name: None for name, value in model_index.items()
+            if not name.startswith("_") and isinstance(value, list) and name not in keep
+        }
+        pipe = pipeline_class.from_pretrained(
+            self.components_dir,
+            torch_dtype=weight_formats.compute_dtype(torch, self.device, self.weights),
+            low_cpu_mem_usage=True,
+            **skipped
+        )
+        return pipe.to(self.device)
+
+    def _staged_call(self, pipe_kwargs):
+        """
+        Runs one render in three stages: encode the prompts, denoise, decode. Only one
+        stage's components are resident at a time. Returns the list of PIL images.
+        """
+        report = self.last_render
+        report["stage_rss_mb"] = {}
+        prompt = pipe_kwargs.pop("prompt")
+        negative_prompt = pipe_kwargs.pop("negative_prompt")
+
+        # Stage 1: text encoders
+        pipe = self._stage_pipeline(keep={"text_encoder", "text_encoder_2", "tokenizer", "tokenizer_2"})
+        if self.weights.get('quantize') == 'int8' and self.device == "cpu":
+            weight_formats.quantize_linear_int8(torch, pipe)
+        with torch.no_grad():
+            embeds = pipe.encode_prompt(
+                prompt=prompt,
+                device=self.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=True,
+                negative_prompt=negative_prompt
+            )
+        report["stage_rss_mb"]["text_encoders"] = lazy_imports.current_rss_mb()
+        del pipe
+        gc.collect()
+        # SDXL returns pooled embeddings as well; SD 1.5/2.1 only the two sequence embeddings
+        names = ["prompt_embeds", "negative_prompt_embeds", "pooled_prompt_embeds", "negative_pooled_prompt_embeds"]
+        pipe_kwargs.update(zip(names, embeds))
+
+        # Stage 2: UNet
+        pipe = self._stage_pipeline(keep={"unet", "scheduler"})
+        self.pipe = pipe
+        self._set_scheduler()
+        if self.device == "cpu":
+            pipe.enable_attention_slicing()
+            if self.weights.get('quantize') == 'int8':
+                weight_formats.quantize_linear_int8(torch, pipe)
+        if self.unet_cache.get('enabled', False):
+            self.feature_cache = UNetFeatureCache(pipe.unet, interval=self.unet_cache.get('interval', 3))
+            self.feature_cache.enable()
+        try:
+            latents = pipe(output_type="latent", **pipe_kwargs).images
+        finally:
+            report["stage_rss_mb"]["unet"] = lazy_imports.current_rss_mb()
+            if self.feature_cache is not None:
+                self.feature_cache.release()
+            self.pipe = None
+            del pipe
+            gc.collect()
+
+        # Stage 3: VAE
+        vae = diffusers.AutoencoderKL.from_pretrained(
+            self.components_dir,
+            subfolder="vae",
+            torch_dtype=weight_formats.compute_dtype(torch, self.device, self.weights),
+            low_cpu_mem_usage=True
+        ).to(self.device)
+        if vae.dtype == torch.float16 and getattr(vae.config, "force_upcast", False):
+            vae = vae.to(torch.float32)
+        with torch.no_grad():
+            decoded = vae.decode(latents.to(vae.dtype) / vae.config.scaling_factor, return_dict=False)[0]
+        vae_scale_factor = 2 ** (len(vae.config.block_out_channels) - 1)
+        report["stage_rss_mb"]["vae"] = lazy_imports.current_rss_mb()
+        del vae
+        gc.collect()
+        VaeImageProcessor = lazy_imports.load("diffusers.image_processor").VaeImageProcessor
+        images = VaeImageProcessor(vae_scale_factor=vae_scale_factor).postprocess(
+            decoded, output_type="pil"
+        )
+        logger.info("Staged render RSS (MB): " + ", ".join(
+            f"{stage} {rss:.0f}" for stage, rss in report["stage_rss_mb"].items() if rss is not None
+        ))
+        return images
+
     def unload(self):
         """Unloads the pipeline and frees memory."""
+        self.components_dir = None
         if self.pipe is not None:
             logger.info("Unloading pipeline...")
             del self.pipe
             self.pipe = None
+            self.img2img_pipe = None
+            self.feature_cache = None
             
             if self.device == "cuda":
                 torch.cuda.empty_cache()
@@ -149,16 +366,59 @@ class LocalImageGenerator:
             gc.collect()
             logger.info("Pipeline unloaded and memory cleaned up.")
 
-    def generate(self, prompt, output_path, negative_prompt=None, width=512, height=512, num_inference_steps=20):
+    def _estimate_seconds_per_step(self, width, height, batch=1):
+        """Estimates seconds per step from earlier renders, or from the saved thread tuning run."""
+        megapixels = width * height * batch / 1e6
+        if self.step_rate is not None:
+            return self.step_rate * megapixels
+        layout = thread_tuning.load_tuning() if self.device == "cpu" else None
+        if layout and layout.get("seconds_per_step"):
+            # Tuning runs at 256x256
+            return layout["seconds_per_step"] / (256 * 256 / 1e6) * megapixels
+        return None
+
+    def _plan_steps(self, num_inference_steps, width, height, time_budget, min_steps, batch=1, strength=1.0):
         """
-        Generates an image from a prompt and saves it.
+        Reduces the step count up front if the estimated render time exceeds the budget.
+        An img2img render only runs 'strength' of the scheduled steps.
+        """
+        estimate = self._estimate_seconds_per_step(width, height, batch)
+        if not time_budget or not estimate:
+            return num_inference_steps
+        # Keep ~2 steps worth of time for the VAE decode
+        affordable = int((time_budget / estimate - 2) / strength)
+        if affordable >= num_inference_steps:
+            return num_inference_steps
+        planned = max(min_steps, affordable)
+        logger.warning(f"Estimated {estimate:.1f}s/step; reducing steps {num_inference_steps} -> {planned} to fit {time_budget:.0f}s budget.")
+        return planned
+
+    def _img2img_pipeline(self):
+        """Returns the image-to-image pipeline built from the loaded components (no extra weights)."""
+        if self.img2img_pipe is None:
+            self.img2img_pipe = diffusers.AutoPipelineForImage2Image.from_pipe(self.pipe)
+        return self.img2img_pipe
+
+    def render(self, prompt, negative_prompt=None, width=512, height=512, num_inference_steps=20,
+               time_budget=None, min_steps=8, seed=None, init_image=None, strength=0.35, cancel_event=None):
+        """
+        Runs the pipeline and returns the PIL image. The pipeline must be loaded.
+        Raises on failure; callers handle loading, saving and error reporting.
+        A list of prompts (and optionally a list of seeds) is rendered as one batch and
+        returns a list of images.
+
+        With time_budget (seconds), the step count is reduced up front when earlier renders
+        show it cannot fit, and the render is cancelled (RenderCancelled) as soon as the
+        measured seconds per step project past the budget. Progress is kept in last_render.
+        A seed makes the result deterministic (the noise is drawn on the CPU so it matches across devices).
+
+        With init_image (a PIL image or encoded image bytes), the render starts from that image
+        instead of pure noise (img2img): it is noised to 'strength' and only that fraction of
+        the num_inference_steps is run. Not available with staged residency.
+
+        cancel_event (a threading/multiprocessing Event) cancels the render at the next step
+        once set, e.g. so a background render gives way to a scheduled cycle.
         """
-        # Auto-load if not loaded
-        loaded_here = False
-        if self.pipe is None:
-            self.load()
-            loaded_here = True
-            
         # Ensure dimensions are multiples of 8
         width = (width // 8) * 8
         height = (height // 8) * 8
@@ -169,31 +429,157 @@ class LocalImageGenerator:
             
         # Truncate prompt to avoid tokenizer warnings/errors (approx 77 tokens ~ 300 chars is safe limit usually)
         # But let's just ensure it's not None.
-        if prompt is None:
+        batched = isinstance(prompt, (list, tuple))
+        if batched:
+            prompt = [p or "" for p in prompt]
+            negative_prompt = [negative_prompt] * len(prompt)
+        elif prompt is None:
             prompt = ""
-            
-        logger.info(f"Generating image for prompt: '{prompt[:100]}...' (Size: {width}x{height})")
+        batch = len(prompt) if batched else 1
+
+        if init_image is not None:
+            if self.components_dir is not None:
+                raise ValueError("img2img renders are not available with staged residency")
+            if isinstance(init_image, (bytes, bytearray, memoryview)):
+                Image = lazy_imports.load("PIL.Image")
+                init_image = Image.open(io.BytesIO(init_image))
+            init_image = init_image.convert("RGB").resize((width, height))
+            strength = min(1.0, max(0.05, strength))
+        else:
+            strength = 1.0
+
+        if seed is None:
+            generator = None
+        elif isinstance(seed, (list, tuple)):
+            generator = [torch.Generator(device="cpu").manual_seed(s) for s in seed]
+        else:
+            generator = torch.Generator(device="cpu").manual_seed(seed)
+
+        if self.pipe is not None and self.applied_scheduler != self.scheduler_name:
+            # Changed by a config reload; switched between renders, never during one
+            self._set_scheduler()
+
+        num_inference_steps = self._plan_steps(num_inference_steps, width, height, time_budget, min_steps, batch, strength)
+        # Steps that actually run (img2img skips the first 1 - strength of the schedule)
+        run_steps = max(1, int(num_inference_steps * strength))
+        start = time.monotonic()
+        deadline = start + time_budget if time_budget else None
+        progress = {"steps_done": 0, "total_steps": num_inference_steps, "elapsed": 0.0,
+                    "seconds_per_step": None, "status": "running"}
+        if init_image is not None:
+            progress["strength"] = strength
+            progress["run_steps"] = run_steps
+        self.last_render = progress
+        marks = []
+        if self.feature_cache is not None:
+            self.feature_cache.reset()
+
+        def on_step_end(pipeline, step, timestep, callback_kwargs):
+            if cancel_event is not None and cancel_event.is_set():
+                raise RenderCancelled("cancelled by the caller")
+            now = time.monotonic()
+            marks.append(now)
+            progress["steps_done"] = step + 1
+            progress["elapsed"] = now - start
+            # The first step includes warm-up; estimate from the following ones
+            if len(marks) >= 3:
+                seconds_per_step = (marks[-1] - marks[0]) / (len(marks) - 1)
+                progress["seconds_per_step"] = seconds_per_step
+                remaining = run_steps - (step + 1)
+                if deadline and now + seconds_per_step * (remaining + 2) > deadline:
+                    raise RenderCancelled(
+                        f"projected {now - start + seconds_per_step * (remaining + 2):.0f}s exceeds {time_budget:.0f}s budget"
+                    )
+            return callback_kwargs
+
+        steps_label = f"{run_steps}/{num_inference_steps} (img2img, strength {strength:.2f})" if init_image is not None else num_inference_steps
+        if batched:
+            logger.info(f"Generating {batch} images in one batch (Size: {width}x{height}, Steps: {steps_label})")
+        else:
+            logger.info(f"Generating image for prompt: '{prompt[:100]}...' (Size: {width}x{height}, Steps: {steps_label})")
+        # Pin the denoising loop (this thread and the OpenMP workers it spawns) if configured
+        previous_affinity = thread_tuning.get_affinity() if self.affinity else None
+        pinned = thread_tuning.set_affinity(self.affinity) if self.affinity else False
         try:
-            image = self.pipe(
+            pipe_kwargs = dict(
                 prompt=prompt,
                 negative_prompt=negative_prompt,
                 width=width,
                 height=height,
                 num_inference_steps=num_inference_steps,
+                generator=generator,
+                callback_on_step_end=on_step_end,
                 cross_attention_kwargs={} # Fix for "NoneType is not iterable" in some diffusers versions
-            ).images[0]
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            image.save(output_path)
-            logger.info(f"Image saved to {output_path}")
-            
+            )
+            if init_image is not None:
+                # The output size follows the (resized) init image
+                del pipe_kwargs["width"], pipe_kwargs["height"]
+                images = self._img2img_pipeline()(
+                    image=[init_image] * batch if batched else init_image, strength=strength, **pipe_kwargs
+                ).images
+            elif self.components_dir is not None:
+                images = self._staged_call(pipe_kwargs)
+            else:
+                images = self.pipe(**pipe_kwargs).images
+            progress["status"] = "done"
+            return images if batched else images[0]
+        except RenderCancelled as e:
+            progress["status"] = "cancelled"
+            logger.warning(f"Render cancelled after {progress['steps_done']}/{progress['total_steps']} steps: {e}")
+            raise
+        except Exception:
+            progress["status"] = "failed"
+            raise
+        finally:
+            progress["elapsed"] = time.monotonic() - start
+            if self.feature_cache is not None and self.feature_cache.full_steps + self.feature_cache.cached_steps:
+                progress["cached_steps"] = self.feature_cache.cached_steps
+                logger.info(f"UNet feature cache: {self.feature_cache.full_steps} full / {self.feature_cache.cached_steps} cached steps")
+            if progress["seconds_per_step"]:
+                self.step_rate = progress["seconds_per_step"] / (width * height * batch / 1e6)
+            if pinned and previous_affinity:
+                thread_tuning.set_affinity(previous_affinity)
+
+    def generate_bytes(self, prompt, negative_prompt=None, width=512, height=512, num_inference_steps=20,
+                       time_budget=None, seed=None, init_image=None, strength=0.35, cancel_event=None):
+        """
+        Generates an image from a prompt and returns it as PNG bytes, without touching disk.
+        init_image/strength: optional img2img start image; cancel_event: see render().
+        Returns None on failure or when the render was cancelled to meet time_budget.
+        """
+        # Auto-load if not loaded
+        loaded_here = False
+        if not self.is_loaded():
+            self.load()
+            # With keep_alive set, the caller unloads after its last render
+            loaded_here = not self.keep_alive
+
+        try:
+            image = self.render(
+                prompt,
+                negative_prompt=negative_prompt,
+                width=width,
+                height=height,
+                num_inference_steps=num_inference_steps,
+                time_budget=time_budget,
+                seed=seed,
+                init_image=init_image,
+                strength=strength,
+                cancel_event=cancel_event
+            )
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+
             # Auto-unload if we loaded it just for this generation
             if loaded_here:
                 self.unload()
-                
-            return output_path
+
+            return buffer.getvalue()
+
+        except RenderCancelled:
+            if loaded_here:
+                self.unload()
+            return None
             
         except Exception as e:
             logger.error(f"Image generation failed: {e}")
@@ -203,6 +589,82 @@ class LocalImageGenerator:
                 self.unload()
             return None
 
+    def generate(self, prompt, output_path, negative_prompt=None, width=512, height=512, num_inference_steps=20,
+                 time_budget=None, seed=None, init_image=None, strength=0.35, cancel_event=None):
+        """
+        Generates an image from a prompt and saves it.
+        Returns None on failure or when the render was cancelled to meet time_budget.
+        """
+        data = self.generate_bytes(
+            prompt,
+            negative_prompt=negative_prompt,
+            width=width,
+            height=height,
+            num_inference_steps=num_inference_steps,
+            time_budget=time_budget,
+            seed=seed,
+            init_image=init_image,
+            strength=strength,
+            cancel_event=cancel_event
+        )
+        if data is None:
+            return None
+
+        # Ensure directory exists
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(data)
+        logger.info(f"Image saved to {output_path}")
+        return output_path
+
+    def generate_batch(self, prompts, output_paths, negative_prompt=None, width=512, height=512, num_inference_steps=20,
+                       time_budget=None, seeds=None, batch_size=2):
+        """
+        Renders several prompts through one loaded pipeline, batch_size images per pipeline
+        call, and saves them to output_paths. time_budget (seconds) covers the whole call;
+        batches that no longer fit are skipped.
+        Returns a list aligned with prompts: the saved path, or None where no image was made.
+        """
+        loaded_here = False
+        if not self.is_loaded():
+            self.load()
+            # With keep_alive set, the caller unloads after its last render
+            loaded_here = not self.keep_alive
+
+        results = [None] * len(prompts)
+        deadline = time.monotonic() + time_budget if time_budget else None
+        batch_size = max(1, batch_size)
+        try:
+            for first in range(0, len(prompts), batch_size):
+                last = min(first + batch_size, len(prompts))
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    logger.warning(f"Time budget used up; skipping {len(prompts) - first} remaining images.")
+                    break
+                images = self.render(
+                    list(prompts[first:last]),
+                    negative_prompt=negative_prompt,
+                    width=width,
+                    height=height,
+                    num_inference_steps=num_inference_steps,
+                    time_budget=remaining,
+                    seed=list(seeds[first:last]) if seeds else None
+                )
+                for index, image in zip(range(first, last), images):
+                    os.makedirs(os.path.dirname(output_paths[index]), exist_ok=True)
+                    image.save(output_paths[index])
+                    results[index] = output_paths[index]
+                    logger.info(f"Image saved to {output_paths[index]}")
+        except RenderCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"Batch image generation failed: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            if loaded_here:
+                self.unload()
+        return results
+
 if __name__ == "__main__":
     # Test
     generator = LocalImageGenerator()
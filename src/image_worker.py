@@ -0,0 +1,286 @@
+import os
+import io
+import time
+import logging
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+
+logger = logging.getLogger(__name__)
+
+
+def _attach_shared_memory(name):
+    """
+    Attaches to a shared memory block created by the worker.
+    The worker owns (and unlinks) the block; spawned children share the parent's
+    resource tracker, so attaching here does not register a second owner.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no 'track' argument
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(conn, generator_kwargs, cancel_flag=None):
+    """
+    Entry point of the image worker process.
+    Owns the diffusion pipeline; the parent process never imports torch/diffusers.
+    cancel_flag (multiprocessing Event) is set by the parent to cancel the current render.
+    """
+    logging.basicConfig(level=logging.INFO)
+    from image_generator import LocalImageGenerator, RenderCancelled
+
+    generator = LocalImageGenerator(**generator_kwargs)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if message.get("cmd") == "stop":
+            break
+        if message.get("cmd") != "generate":
+            conn.send({"ok": False, "error": f"Unknown command: {message.get('cmd')}"})
+            continue
+
+        try:
+            generator.load()
+            result = generator.render(cancel_event=cancel_flag, **message["kwargs"])
+            # A batch render (list of prompts) returns a list; all PNGs share one block
+            chunks = []
+            for image in (result if isinstance(result, list) else [result]):
+                buffer = io.BytesIO()
+                image.save(buffer, format="PNG")
+                chunks.append(buffer.getvalue())
+            data = b"".join(chunks)
+
+            shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+            try:
+                shm.buf[:len(data)] = data
+                conn.send({"ok": True, "shm": shm.name, "sizes": [len(c) for c in chunks], "report": generator.last_render})
+                # Keep the block alive until the parent has copied it (required on Windows)
+                conn.recv()
+            finally:
+                shm.close()
+                shm.unlink()
+        except RenderCancelled as e:
+            conn.send({"ok": False, "error": f"cancelled: {e}", "report": generator.last_render})
+        except Exception as e:
+            logger.error(f"Worker image generation failed: {e}")
+            logger.error(traceback.format_exc())
+            conn.send({"ok": False, "error": str(e), "report": generator.last_render})
+
+    generator.unload()
+    conn.close()
+
+
+class ImageWorkerClient:
+    """
+    Runs LocalImageGenerator in a dedicated worker process.
+
+    Model memory lives only in the worker, so stopping or recycling it returns all of it
+    to the OS. Encoded image bytes come back through shared memory.
+    Exposes the same generate()/load()/unload() interface as LocalImageGenerator.
+    """
+
+    def __init__(self, keep_alive=False, max_jobs=10, timeout=3600, **generator_kwargs):
+        """
+        Args:
+            keep_alive (bool): Keep the worker (and the loaded model) between generations.
+            max_jobs (int): Recycle the worker after this many images when keep_alive is set.
+            timeout (float): Seconds to wait for a single image before killing the worker.
+            **generator_kwargs: Passed to LocalImageGenerator in the worker.
+        """
+        self.keep_alive = keep_alive
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.generator_kwargs = generator_kwargs
+        self.process = None
+        self.conn = None
+        self.jobs = 0
+        # Shared with the worker; set to cancel the render in progress
+        self.cancel_flag = None
+        # generator_kwargs the running worker was started with
+        self.started_kwargs = None
+        # Number of worker processes started (lets a caller see whether it caused a start)
+        self.load_count = 0
+        # Progress of the last render as reported by the worker
+        self.last_render = None
+
+    def is_loaded(self):
+        return self.process is not None and self.process.is_alive()
+
+    def load(self):
+        """
+        Starts the worker process if it is not running, or restarts it if generator_kwargs
+        changed since it was started (e.g. a reloaded scheduler).
+        """
+        if self.is_loaded():
+            if self.generator_kwargs == self.started_kwargs:
+                return
+            logger.info("Image worker settings changed; restarting the worker.")
+            self.unload()
+
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        self.cancel_flag = ctx.Event()
+        self.started_kwargs = dict(self.generator_kwargs)
+        self.load_count += 1
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.generator_kwargs, self.cancel_flag),
+            name="image-worker",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.jobs = 0
+        logger.info(f"Started image worker process (PID: {self.process.pid})")
+
+    def unload(self):
+        """Stops the worker process, releasing all model memory."""
+        if self.process is None:
+            return
+
+        logger.info(f"Stopping image worker process (PID: {self.process.pid})...")
+        try:
+            self.conn.send({"cmd": "stop"})
+        except (OSError, EOFError):
+            pass
+        self.process.join(timeout=30)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def _render(self, kwargs, cancel_event=None):
+        """
+        Sends one render job to the worker and returns the list of PNG bytes, or None on failure.
+        Setting cancel_event (a threading Event) cancels the render in the worker at its next step.
+        """
+        self.load()
+        try:
+            self.cancel_flag.clear()
+            self.conn.send({"cmd": "generate", "kwargs": kwargs})
+            deadline = time.monotonic() + self.timeout
+            while not self.conn.poll(0.5):
+                if cancel_event is not None and cancel_event.is_set():
+                    self.cancel_flag.set()
+                if time.monotonic() > deadline:
+                    logger.error(f"Image worker did not answer within {self.timeout}s. Killing it.")
+                    self.process.kill()
+                    raise TimeoutError("image worker timed out")
+
+            reply = self.conn.recv()
+            self.last_render = reply.get("report")
+            if not reply.get("ok"):
+                logger.error(f"Image worker failed: {reply.get('error')}")
+                return None
+            shm = _attach_shared_memory(reply["shm"])
+            try:
+                images = []
+                offset = 0
+                for size in reply["sizes"]:
+                    images.append(bytes(shm.buf[offset:offset + size]))
+                    offset += size
+            finally:
+                shm.close()
+                self.conn.send({"cmd": "ack"})
+        except (OSError, EOFError, TimeoutError) as e:
+            logger.error(f"Image worker communication failed: {e}")
+            self.unload()
+            return None
+        self.jobs += 1
+        return images
+
+    def _release(self):
+        """Stops the worker after a job unless it is kept alive and below max_jobs."""
+        if self.process is not None and (not self.keep_alive or self.jobs >= self.max_jobs):
+            self.unload()
+
+    def generate_bytes(self, prompt, negative_prompt=None, width=512, height=512, num_inference_steps=20,
+                       time_budget=None, seed=None, init_image=None, strength=0.35, cancel_event=None):
+        """
+        Generates an image in the worker and returns the PNG bytes, or None on failure.
+        init_image (encoded image bytes) starts an img2img render, see LocalImageGenerator.render().
+        cancel_event (a threading Event) cancels the render once set.
+        """
+        kwargs = {
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "width": width,
+            "height": height,
+            "num_inference_steps": num_inference_steps,
+            "time_budget": time_budget,
+            "seed": seed,
+        }
+        if init_image is not None:
+            kwargs.update(init_image=bytes(init_image), strength=strength)
+        images = self._render(kwargs, cancel_event)
+        self._release()
+        return images[0] if images else None
+
+    def generate(self, prompt, output_path, negative_prompt=None, width=512, height=512, num_inference_steps=20,
+                 time_budget=None, seed=None, init_image=None, strength=0.35, cancel_event=None):
+        """
+        Generates an image in the worker and saves it to output_path.
+        """
+        data = self.generate_bytes(
+            prompt,
+            negative_prompt=negative_prompt,
+            width=width,
+            height=height,
+            num_inference_steps=num_inference_steps,
+            time_budget=time_budget,
+            seed=seed,
+            init_image=init_image,
+            strength=strength,
+            cancel_event=cancel_event
+        )
+        if data is None:
+            return None
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(data)
+        logger.info(f"Image saved to {output_path}")
+        return output_path
+
+    def generate_batch(self, prompts, output_paths, negative_prompt=None, width=512, height=512, num_inference_steps=20,
+                       time_budget=None, seeds=None, batch_size=2):
+        """
+        Renders several prompts in the worker, batch_size images per pipeline call, and saves
+        them to output_paths. The worker stays up for the whole call.
+        Returns a list aligned with prompts: the saved path, or None where no image was made.
+        """
+        results = [None] * len(prompts)
+        deadline = time.monotonic() + time_budget if time_budget else None
+        batch_size = max(1, batch_size)
+        for first in range(0, len(prompts), batch_size):
+            last = min(first + batch_size, len(prompts))
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                logger.warning(f"Time budget used up; skipping {len(prompts) - first} remaining images.")
+                break
+            images = self._render({
+                "prompt": list(prompts[first:last]),
+                "negative_prompt": negative_prompt,
+                "width": width,
+                "height": height,
+                "num_inference_steps": num_inference_steps,
+                "time_budget": remaining,
+                "seed": list(seeds[first:last]) if seeds else None,
+            })
+            if images is None:
+                break
+            for index, data in zip(range(first, last), images):
+                os.makedirs(os.path.dirname(output_paths[index]), exist_ok=True)
+                with open(output_paths[index], "wb") as f:
+                    f.write(data)
+                results[index] = output_paths[index]
+        self._release()
+        return results
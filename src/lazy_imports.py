@@ -0,0 +1,62 @@
+import sys
+import time
+import importlib
+
+# module name -> {"seconds": float, "rss_mb": float or None, "new_modules": int}
+_report = {}
+
+
+def current_rss_mb():
+    """Returns the current resident set size in MB, or None if unavailable on this platform."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        import resource
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, ImportError, ValueError, IndexError):
+        return None
+
+
+def load(name):
+    """
+    Imports a module and records how long it took, how much RSS it added and how many
+    modules it pulled in. Already imported modules are returned without being recorded.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    modules_before = len(sys.modules)
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    _report[name] = {
+        "seconds": elapsed,
+        "rss_mb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        "new_modules": len(sys.modules) - modules_before,
+    }
+    return module
+
+
+def is_loaded(name):
+    """Returns True if the module has already been imported (by anyone)."""
+    return name in sys.modules
+
+
+def print_report():
+    """Prints the per-module import report collected so far."""
+    print("\n[IMPORT] Import-time report:")
+    if not _report:
+        print("  (no modules loaded through lazy_imports)")
+        return
+
+    total = 0.0
+    for name, entry in sorted(_report.items(), key=lambda item: item[1]["seconds"], reverse=True):
+        total += entry["seconds"]
+        rss = f"{entry['rss_mb']:+.1f} MB" if entry["rss_mb"] is not None else "n/a"
+        print(f"  {name:<20} {entry['seconds']:7.3f}s  RSS {rss:>10}  ({entry['new_modules']} modules)")
+    print(f"  {'total':<20} {total:7.3f}s")
+    heavy = [name for name in ("torch", "diffusers", "transformers") if name in sys.modules]
+    print(f"  ML stack loaded: {', '.join(heavy) if heavy else 'no'}")
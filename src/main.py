@@ -1,49 +1,265 @@
 import sys
 import os
+import re
+import html
 import random
 import time
-from datetime import datetime, timezone, timedelta
-from config import load_config, validate_config
-from generator import GeminiGenerator
-from note_api import NoteUploader
-try:
-    from image_generator import LocalImageGenerator
-except ImportError:
-    LocalImageGenerator = None
-
-def process_config_placeholders(config):
-    """
-    Recursively replaces placeholders in the config dictionary.
-    Supported placeholders:
-    - {current_time}: Replaced with current timestamp (YYYY-MM-DD-HH-mm) in JST.
-    """
-    if isinstance(config, dict):
-        return {k: process_config_placeholders(v) for k, v in config.items()}
-    elif isinstance(config, list):
-        return [process_config_placeholders(v) for v in config]
-    elif isinstance(config, str):
-        if "{current_time}" in config:
-            # Format: YYYY-MM-DD-HH-mm (JST)
-            jst = timezone(timedelta(hours=9))
-            timestamp = datetime.now(jst).strftime("%Y-%m-%d-%H-%M")
-            return config.replace("{current_time}", timestamp)
-        return config
-    else:
-        return config
+import argparse
+import contextlib
+import importlib.util
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import lazy_imports
+from config import ConfigWatcher, validate_config
+from image_cache import ImageCache, cache_key
+
+def create_eyecatch_library(config):
+    EyecatchIndex = lazy_imports.load("eyecatch_index").EyecatchIndex
+    library_config = config.get('eyecatch_library', {})
+    return EyecatchIndex(
+        directory="eyecatch",
+        width=library_config.get('width', 1280),
+        height=library_config.get('height', 670),
+        duplicate_distance=library_config.get('duplicate_distance', 6)
+    )
 
-def run_report(config, generator, uploader, image_generator=None):
+def get_render_kwargs(img_config):
+    return {
+        'negative_prompt': img_config.get('negative_prompt'),
+        'width': img_config.get('width', 512),
+        'height': img_config.get('height', 512),
+        'num_inference_steps': img_config.get('steps', 20)
+    }
+
+def get_cache_params(img_config, prompt, render_kwargs, seed, init=None, strength=None):
     """
-    Executes a single reporting cycle.
+    Everything that determines a rendered image; hashed into its image cache key.
+    init/strength identify the start image of an img2img refresh (absent for normal renders).
     """
-    # Process placeholders in config
-    config = process_config_placeholders(config)
-    
-    print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Starting report generation cycle...")
+    params = {
+        'prompt': prompt,
+        'negative_prompt': render_kwargs['negative_prompt'],
+        'model_id': img_config.get('model_id'),
+        'scheduler': img_config.get('scheduler', 'Euler a'),
+        'weights': img_config.get('weights') if img_config.get('device', 'cpu') == 'cpu' else None,
+        'unet_cache': img_config.get('unet_cache') if (img_config.get('unet_cache') or {}).get('enabled') else None,
+        'steps': render_kwargs['num_inference_steps'],
+        'width': (render_kwargs['width'] // 8) * 8,
+        'height': (render_kwargs['height'] // 8) * 8,
+        'seed': seed
+    }
+    if init is not None:
+        params.update(init=init, strength=strength)
+    return params
 
-    # 3. Determine Topics (Genres)
-    genres = config.get('topic_genres', ["金融", "政治", "カルチャー", "サブカルチャー"])
-    print(f"[INFO] Target Genres: {genres}")
+def find_refresh_source(img_config, base_prompt, render_kwargs, image_cache):
+    """
+    Picks a cached render of the same base prompt (and model, scheduler and size) to start an
+    img2img refresh from, or returns None for a full render: when refresh is disabled, no
+    source exists yet, or for the fresh_ratio share of renders that keep the sources varied.
+    Returns (source key, image bytes, strength).
+    """
+    refresh = img_config.get('refresh', {})
+    if not refresh.get('enabled', False) or image_cache is None or not base_prompt:
+        return None
+    if img_config.get('residency', 'full') == 'staged':
+        return None
+    if random.random() < refresh.get('fresh_ratio', 0.2):
+        return None
+    found = image_cache.find_source(
+        base_prompt,
+        model_id=img_config.get('model_id'),
+        scheduler=img_config.get('scheduler', 'Euler a'),
+        width=(render_kwargs['width'] // 8) * 8,
+        height=(render_kwargs['height'] // 8) * 8
+    )
+    if found is None:
+        return None
+    key, path = found
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        print(f"[WARN] Could not read refresh source {path}: {e}")
+        return None
+    print(f"[INFO] Refreshing cached render {os.path.basename(path)} (img2img strength {refresh.get('strength', 0.35)})")
+    return key, data, refresh.get('strength', 0.35)
+
+def is_complete_render(cache_params, image_generator):
+    """False if the last render used fewer steps to meet its time budget (not a valid result for its key)."""
+    report = getattr(image_generator, 'last_render', None) or {}
+    return report.get('total_steps', cache_params['steps']) == cache_params['steps']
+
+def store_render(image_cache, key, cache_params, path, image_generator):
+    """Registers a fresh render in the image cache and returns its final path."""
+    if is_complete_render(cache_params, image_generator):
+        image_cache.add(key, cache_params)
+        return path
+    reduced_path = os.path.join(image_cache.directory, f"reduced_{os.path.basename(path)}")
+    os.replace(path, reduced_path)
+    image_cache.adopt(reduced_path)
+    return reduced_path
+
+def store_render_data(image_cache, key, cache_params, data, image_generator):
+    """Hands fresh render bytes to the image cache, which writes them in the background. Returns the path."""
+    if is_complete_render(cache_params, image_generator):
+        return image_cache.store(key, data, cache_params)
+    return image_cache.store(key, data, name=f"reduced_{key}.png")
+
+@contextlib.contextmanager
+def hold_pipeline(image_generator, eyecatch_bank=None):
+    """
+    Keeps the image pipeline (or worker process) loaded across all renders inside the block,
+    so the eyecatch and the section images share one load. A load that happened inside the
+    block is released at the end (unless the generator is kept alive anyway), even if the
+    pipeline was loaded when the block started and the bank unloaded it meanwhile.
+    Nothing is loaded if nothing renders.
+    """
+    if image_generator is None:
+        yield
+        return
+    loads_before = image_generator.load_count
+    keep_alive = image_generator.keep_alive
+    image_generator.keep_alive = True
+    try:
+        yield
+    finally:
+        image_generator.keep_alive = keep_alive
+        if not keep_alive and image_generator.load_count != loads_before:
+            with (eyecatch_bank.lock if eyecatch_bank is not None else contextlib.nullcontext()):
+                image_generator.unload()
+
+def markdown_sections(markdown_text):
+    """
+    Splits an article into (heading, text) pairs, one per <h3> of its rendered HTML.
+    Rendering with the same Markdown converter as NoteUploader keeps the sections aligned with
+    the headings inject_section_images() places images after (e.g. '###Heading' is an <h3> too).
+    """
+    body_html = lazy_imports.load("markdown").markdown(markdown_text)
+    sections = []
+    position = 0
+    for match in re.finditer(r'<h([1-6])[^>]*>(.*?)</h\1>', body_html, flags=re.S):
+        if sections and sections[-1] is not None:
+            sections[-1][1].append(body_html[position:match.start()])
+        position = match.end()
+        level = int(match.group(1))
+        if level == 3:
+            sections.append([match.group(2), []])
+        elif level < 3:
+            # A higher-level heading ends the current section
+            sections.append(None)
+        elif sections and sections[-1] is not None:
+            sections[-1][1].append(match.group(0))
+    if sections and sections[-1] is not None:
+        sections[-1][1].append(body_html[position:])
+
+    def plain_text(fragment):
+        return html.unescape(re.sub(r'<[^>]+>', '', fragment)).strip()
+
+    return [(plain_text(heading), plain_text("".join(parts))) for heading, parts in filter(None, sections)]
+
+def create_section_images(article_body, img_config, generator, image_generator, eyecatch_bank=None, image_cache=None):
+    """
+    Renders one inline image per '###' section (at most inline_images.max_images) in batches
+    through the image generator. Returns a list of image paths aligned with the sections
+    (None where no image was made), or None if the article has no sections.
+    """
+    inline_config = img_config.get('inline_images', {})
+    sections = markdown_sections(article_body)[:inline_config.get('max_images', 4)]
+    if not sections:
+        return None
+
+    start = time.monotonic()
+    prompts_list = img_config.get('prompts', [])
+    base_prompt = random.choice(prompts_list) if prompts_list else ""
+    with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+        context_prompts = list(executor.map(
+            generator.generate_image_prompt, [f"{heading}\n{text}" for heading, text in sections]
+        ))
+    prompt_seconds = time.monotonic() - start
+
+    render_kwargs = get_render_kwargs(img_config)
+    render_kwargs.update({
+        'width': inline_config.get('width', 768),
+        'height': inline_config.get('height', 432),
+        'num_inference_steps': inline_config.get('steps', render_kwargs['num_inference_steps'])
+    })
+    base_seed = img_config.get('seed')
+    if base_seed is None:
+        base_seed = random.randrange(2 ** 32)
+
+    paths = [None] * len(sections)
+    pending = []  # (index, prompt, seed, key, cache_params)
+    for index, context_prompt in enumerate(context_prompts):
+        prompt = ", ".join(p for p in (base_prompt, context_prompt) if p)
+        seed = (base_seed + index) % 2 ** 32
+        cache_params = get_cache_params(img_config, prompt, render_kwargs, seed)
+        key = cache_key(**cache_params)
+        paths[index] = image_cache.get(key) if image_cache is not None else None
+        if paths[index] is None:
+            pending.append((index, prompt, seed, key, cache_params))
+
+    render_start = time.monotonic()
+    if pending:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_paths = [
+            image_cache.path_for(key) if image_cache is not None
+            else os.path.join("eyecatch", "generated", f"section_{timestamp}_{index}.png")
+            for index, _, _, key, _ in pending
+        ]
+        # Wait for a background bank render in progress, if any
+        with (eyecatch_bank.lock if eyecatch_bank is not None else contextlib.nullcontext()):
+            results = image_generator.generate_batch(
+                [prompt for _, prompt, _, _, _ in pending],
+                output_paths,
+                seeds=[seed for _, _, seed, _, _ in pending],
+                time_budget=inline_config.get('time_budget_seconds'),
+                batch_size=inline_config.get('batch_size', 2),
+                **render_kwargs
+            )
+        for (index, _, _, key, cache_params), path in zip(pending, results):
+            if path and image_cache is not None:
+                path = store_render(image_cache, key, cache_params, path, image_generator)
+            paths[index] = path
+    render_seconds = time.monotonic() - render_start
+
+    ready = sum(1 for path in paths if path)
+    print(f"[INFO] Section images: {ready}/{len(sections)} ready ({len(sections) - len(pending)} cached) "
+          f"- prompts {prompt_seconds:.1f}s, render {render_seconds:.1f}s")
+    return paths
+
+def create_eyecatch_bank(config, image_generator):
+    """Creates the background eyecatch bank if enabled. Call start() to begin filling it."""
+    img_config = config.get('image_generation', {})
+    bank_config = img_config.get('bank', {})
+    if not image_generator or not bank_config.get('enabled', False):
+        return None
+    EyecatchBank = lazy_imports.load("eyecatch_bank").EyecatchBank
+    bank = EyecatchBank(
+        image_generator,
+        prompts=img_config.get('prompts', []),
+        render_kwargs=get_render_kwargs(img_config),
+        size=bank_config.get('size', 3),
+        schedule_times=get_schedule_times(config),
+        idle_margin_minutes=bank_config.get('idle_margin_minutes', 30)
+    )
+    print(f"[INIT] Eyecatch bank: {len(bank)}/{bank.size} pre-rendered images ready.")
+    return bank
 
+def create_image_cache(config):
+    img_config = config.get('image_generation', {})
+    if not img_config.get('enabled', False):
+        return None
+    return ImageCache(
+        directory=os.path.join("eyecatch", "generated"),
+        max_bytes=int(img_config.get('cache_max_mb', 500) * 1024 * 1024)
+    )
+
+def generate_report(config, generator, genres):
+    """
+    Generates the article for the given genres and splits off its title.
+    Returns (title, article_body), or (None, None) if generation failed.
+    """
     # 4. Generate Content (Gemini Grounding)
     print("[INFO] Generating report with Gemini Grounding...")
     # Title format: YYYY-MM-DD 午前/午後レポート
@@ -52,10 +268,18 @@ def run_report(config, generator, uploader, image_generator=None):
     period = "午前" if current_hour < 12 else "午後"
     title = f"{today_str} {period}レポート"
     
-    article_body = generator.generate_article(genres)
+    fanout_config = config.get('article_fanout', {})
+    if fanout_config.get('enabled', False):
+        article_body = generator.generate_article_fanout(
+            genres,
+            max_concurrency=fanout_config.get('max_concurrency', 3),
+            genres_per_call=fanout_config.get('genres_per_call', 1),
+            merge=fanout_config.get('merge', 'model')
+        )
+    else:
+        article_body = generator.generate_article(genres)
     if not article_body:
-        print("[ERROR] Content generation failed. Skipping this cycle.")
-        return
+        return None, None
 
     # Extract Title from Article Body (First Line)
     lines = article_body.strip().split('\n')
@@ -80,16 +304,35 @@ def run_report(config, generator, uploader, image_generator=None):
 
     print(f"\n--- Generated Report ---\nTitle: {title}\nLength: {len(article_body)} chars\nPreview: {article_body[:500]}...\n------------------------\n")
 
-    # 6. Upload to Note.com
-    upload_status = config.get('upload_status', 'draft')
-    print(f"[INFO] Uploading to Note.com as {upload_status}...")
-    
+    return title, article_body
+
+def select_eyecatch(config, article_body, generator, image_generator=None, eyecatch_library=None, eyecatch_bank=None,
+                    image_cache=None, in_memory=False):
+    """
+    Returns the eyecatch image path for an article: a banked or freshly generated image
+    when image generation is enabled, otherwise (or on failure) one from the library.
+    With in_memory, a fresh render is returned as PNG bytes instead and written to the
+    image cache in the background, so the upload does not wait for disk.
+    """
     # Determine eyecatch image
     eyecatch_path = None
     
     # Priority 0: Generate Image (if enabled)
     img_config = config.get('image_generation', {})
-    if img_config.get('enabled', False) and image_generator:
+
+    # Priority 0a: Pre-rendered image from the background bank (if enabled)
+    if img_config.get('enabled', False) and eyecatch_bank is not None and len(eyecatch_bank):
+        bank_context = None
+        if img_config.get('bank', {}).get('match_context', True) and img_config.get('use_article_context', True):
+            bank_context = generator.generate_image_prompt(article_body)
+            print(f"[INFO] Generated context prompt for bank match: {bank_context}")
+        eyecatch_path = eyecatch_bank.take(bank_context, output_dir=os.path.join("eyecatch", "generated"))
+        if eyecatch_path and image_cache is not None:
+            image_cache.adopt(eyecatch_path)
+        if eyecatch_path:
+            print(f"[SUCCESS] Using pre-rendered image: {eyecatch_path} ({len(eyecatch_bank)} left in bank)")
+
+    if img_config.get('enabled', False) and image_generator and not eyecatch_path:
         print("[INFO] Attempting to generate eyecatch image...")
         
         # Determine Prompt
@@ -114,57 +357,333 @@ def run_report(config, generator, uploader, image_generator=None):
             
         print(f"[INFO] Final Image Prompt: {image_prompt}")
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"generated_{timestamp}.png"
-        output_path = os.path.join("eyecatch", "generated", output_filename)
-        
-        generated_path = image_generator.generate(
-            prompt=image_prompt,
-            output_path=output_path,
-            negative_prompt=img_config.get('negative_prompt'),
-            width=img_config.get('width', 512),
-            height=img_config.get('height', 512),
-            num_inference_steps=img_config.get('steps', 20)
-        )
+        # Deterministic render request: identical requests are served from the cache
+        render_kwargs = get_render_kwargs(img_config)
+        seed = img_config.get('seed')
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        # Optionally start from an earlier render of the same base prompt (img2img, fewer steps)
+        refresh_source = find_refresh_source(img_config, base_prompt, render_kwargs, image_cache)
+        if refresh_source:
+            source_key, source_data, strength = refresh_source
+            cache_params = get_cache_params(img_config, image_prompt, render_kwargs, seed, init=source_key, strength=strength)
+            render_kwargs.update(init_image=source_data, strength=strength)
+        else:
+            cache_params = get_cache_params(img_config, image_prompt, render_kwargs, seed)
+        key = cache_key(**cache_params)
+        generated_path = image_cache.get(key) if image_cache is not None else None
+
+        if generated_path:
+            print(f"[INFO] Image cache hit: {generated_path}")
+        else:
+            if image_cache is not None:
+                output_path = image_cache.path_for(key)
+            else:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                output_path = os.path.join("eyecatch", "generated", f"generated_{timestamp}.png")
+
+            image_data = None
+            # Wait for a background bank render in progress, if any
+            with (eyecatch_bank.lock if eyecatch_bank is not None else contextlib.nullcontext()):
+                if in_memory:
+                    image_data = image_generator.generate_bytes(
+                        prompt=image_prompt,
+                        time_budget=img_config.get('time_budget_seconds'),
+                        seed=seed,
+                        **render_kwargs
+                    )
+                else:
+                    generated_path = image_generator.generate(
+                        prompt=image_prompt,
+                        output_path=output_path,
+                        time_budget=img_config.get('time_budget_seconds'),
+                        seed=seed,
+                        **render_kwargs
+                    )
+
+            if in_memory and image_data is not None:
+                if image_cache is not None:
+                    generated_path = store_render_data(image_cache, key, cache_params, image_data, image_generator)
+                print(f"[SUCCESS] Generated image: {len(image_data)} bytes in memory (saving to {generated_path} in the background)")
+                return image_data
+            if generated_path and image_cache is not None:
+                generated_path = store_render(image_cache, key, cache_params, generated_path, image_generator)
         
         if generated_path:
             eyecatch_path = generated_path
             print(f"[SUCCESS] Generated image: {eyecatch_path}")
         else:
-            print("[WARN] Image generation failed. Falling back to local files.")
+            report = getattr(image_generator, 'last_render', None)
+            if report:
+                print(f"[WARN] Image generation {report['status']} after {report['steps_done']}/{report['total_steps']} steps ({report['elapsed']:.0f}s). Falling back to local files.")
+            else:
+                print("[WARN] Image generation failed. Falling back to local files.")
 
-    # Priority 1: Random image from 'eyecatch' folder (Fallback)
+    # Priority 1: Least recently used image from 'eyecatch' folder (Fallback)
     if not eyecatch_path:
-        eyecatch_dir = "eyecatch"
-        if os.path.exists(eyecatch_dir) and os.path.isdir(eyecatch_dir):
-            images = [
-                os.path.join(eyecatch_dir, f) 
-                for f in os.listdir(eyecatch_dir) 
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')) and "generated" not in f
-            ]
-            if images:
-                eyecatch_path = random.choice(images)
-                print(f"[INFO] Selected random eyecatch image: {eyecatch_path}")
+        if eyecatch_library is None:
+            eyecatch_library = create_eyecatch_library(config)
+        eyecatch_library.refresh()
+        eyecatch_path = eyecatch_library.select()
+        if eyecatch_path:
+            print(f"[INFO] Selected eyecatch image: {eyecatch_path}")
     
     # Priority 2: Root eyecatch.png (Fallback)
     if not eyecatch_path and os.path.exists("eyecatch.png"):
         eyecatch_path = "eyecatch.png"
         print(f"[INFO] Using default eyecatch image: {eyecatch_path}")
 
-    note_url = uploader.create_article(title, article_body, status=upload_status, eyecatch_path=eyecatch_path)
+    return eyecatch_path
+
+def run_report(config, generator, uploader, image_generator=None, eyecatch_library=None, eyecatch_bank=None,
+               image_cache=None):
+    """
+    Executes a single reporting cycle.
+    'config' is the rendered config for this cycle (placeholders already substituted).
+    """
+    generator.begin_cycle()
+    
+    print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Starting report generation cycle...")
+
+    # 3. Determine Topics (Genres)
+    genres = config.get('topic_genres', ["金融", "政治", "カルチャー", "サブカルチャー"])
+    print(f"[INFO] Target Genres: {genres}")
+
+    title, article_body = generate_report(config, generator, genres)
+    if not article_body:
+        print("[ERROR] Content generation failed. Skipping this cycle.")
+        return
+
+    # 6. Upload to Note.com
+    upload_status = config.get('upload_status', 'draft')
+    print(f"[INFO] Uploading to Note.com as {upload_status}...")
+
+    img_config = config.get('image_generation', {})
+    section_images = None
+    inline_config = img_config.get('inline_images', {})
+    # One pipeline load serves the eyecatch and the section images
+    with hold_pipeline(image_generator, eyecatch_bank):
+        # Fresh renders go straight from memory to the upload; the cache writes them to disk meanwhile
+        eyecatch_path = select_eyecatch(config, article_body, generator, image_generator, eyecatch_library, eyecatch_bank,
+                                        image_cache, in_memory=img_config.get('in_memory_upload', True))
+
+        # Optional inline images, one per '###' section
+        if img_config.get('enabled', False) and image_generator and inline_config.get('enabled', False):
+            section_images = create_section_images(article_body, img_config, generator, image_generator, eyecatch_bank, image_cache)
+
+    note_url = uploader.create_article(
+        title,
+        article_body,
+        status=upload_status,
+        eyecatch_path=eyecatch_path,
+        section_images=section_images,
+        upload_concurrency=inline_config.get('upload_concurrency', 4)
+    )
     
     if note_url:
         print(f"\n[SUCCESS] Article created successfully!\nURL: {note_url}")
     else:
         print("\n[ERROR] Failed to create article.")
 
+    print("[INFO] Gemini latency stats:")
+    for line in generator.router.tracker.summary():
+        print(f"  {line}")
+    print(f"  {generator.caller.summary()}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Note.com AI Writer (Scheduled Mode)")
+    parser.add_argument("--check", action="store_true",
+                        help="Validate config and authentication without loading the ML stack, then exit.")
+    parser.add_argument("--import-report", action="store_true",
+                        help="Print per-module import time and memory after startup.")
+    parser.add_argument("--record-traffic", metavar="HAR_PATH",
+                        help="Record note.com API exchanges to a HAR file after each cycle (for replay_note_api.py).")
+    return parser.parse_args()
+
+def create_generator(config):
+    GeminiGenerator = lazy_imports.load("generator").GeminiGenerator
+    return GeminiGenerator(
+        api_key=config['gemini_api_key'],
+        model_name=config.get('gemini_model', 'gemini-2.0-flash-exp'),
+        system_prompt=config['system_prompt'],
+        use_search=config.get('use_search', True),
+        routing=config.get('model_routing'),
+        context_cache=config.get('context_cache'),
+        gemini_client=config.get('gemini_client')
+    )
+
+def ml_stack_available():
+    """Checks that torch and diffusers are installed without importing them."""
+    return all(importlib.util.find_spec(name) is not None for name in ("torch", "diffusers"))
+
+def create_image_generator(config):
+    """
+    Creates the image generator if enabled. Only configuration is prepared here;
+    torch/diffusers are imported when the first image is generated.
+    """
+    img_config = config.get('image_generation', {})
+    if not img_config.get('enabled', False):
+        return None
+    if not ml_stack_available():
+        print("[WARN] LocalImageGenerator not found. Please install requirements.")
+        return None
+
+    worker_config = img_config.get('worker', {})
+    device = img_config.get('device', 'cpu')
+    scheduler = img_config.get('scheduler', 'Euler a')
+    generator_kwargs = {
+        'model_id': img_config.get('model_id', "runwayml/stable-diffusion-v1-5"),
+        'device': device,
+        'scheduler_name': scheduler,
+        'threads': img_config.get('threads'),
+        'weights': img_config.get('weights'),
+        'unet_cache': img_config.get('unet_cache'),
+        'residency': img_config.get('residency', 'full')
+    }
+    try:
+        if worker_config.get('enabled', False):
+            print(f"[INIT] Initializing Image Worker process config (Model: {generator_kwargs['model_id']}, Device: {device}, Scheduler: {scheduler})...")
+            ImageWorkerClient = lazy_imports.load("image_worker").ImageWorkerClient
+            return ImageWorkerClient(
+                keep_alive=worker_config.get('keep_alive', False),
+                max_jobs=worker_config.get('max_jobs', 10),
+                timeout=worker_config.get('timeout', 3600),
+                **generator_kwargs
+            )
+        print(f"[INIT] Initializing Local Image Generator config (Model: {generator_kwargs['model_id']}, Device: {device}, Scheduler: {scheduler})...")
+        LocalImageGenerator = lazy_imports.load("image_generator").LocalImageGenerator
+        return LocalImageGenerator(**generator_kwargs)
+    except Exception as e:
+        print(f"[ERROR] Failed to initialize image generator: {e}")
+        return None
+
+def create_uploader(config, recorder=None, concurrent_articles=1):
+    """
+    Creates a NoteUploader from the session cookie, or logs in with email/password.
+    A TrafficRecorder is attached before logging in, so sign_in is recorded too.
+    concurrent_articles: articles uploaded at once through this uploader (batch uploaders).
+    Returns None if authentication is impossible.
+    """
+    NoteUploader = lazy_imports.load("note_api").NoteUploader
+    pool_size = config.get('image_generation', {}).get('inline_images', {}).get('upload_concurrency', 4)
+    # Each article's uploads (body images + eyecatch) need their own connections
+    pool_size = concurrent_articles * (pool_size + 1) - 1
+    draft_pool = config.get('draft_pool')
+    session_cookie = config.get('note_session_cookie')
+    if session_cookie and not session_cookie.startswith("YOUR_"):
+        print("[INFO] Using configured session cookie.")
+        uploader = NoteUploader(session_cookie=session_cookie, pool_size=pool_size, draft_pool=draft_pool)
+        if recorder is not None:
+            recorder.attach(uploader.session)
+        return uploader
+
+    print("[INFO] Session cookie not found. Attempting auto-login...")
+    email = config.get('note_email')
+    password = config.get('note_password')
+    if not (email and password):
+        print("[FATAL] No session cookie and no credentials provided.")
+        return None
+
+    uploader = NoteUploader(pool_size=pool_size, draft_pool=draft_pool)
+    if recorder is not None:
+        recorder.attach(uploader.session)
+    if not uploader.login(email, password):
+        print("[FATAL] Auto-login failed. Please check credentials or use session cookie.")
+        return None
+    return uploader
+
+def run_check(config):
+    """
+    Validates Gemini and Note.com authentication and the image generation settings
+    without importing torch/diffusers. Returns True if everything is usable.
+    """
+    print("\n[CHECK] Gemini...")
+    ok = create_generator(config).check_auth()
+
+    print("\n[CHECK] Note.com...")
+    uploader = create_uploader(config)
+    ok = uploader is not None and uploader.check_auth() and ok
+    if uploader is not None and uploader.draft_pool_size > 0:
+        print(f"[INFO] Draft pool: {uploader.draft_pool_status()}")
+
+    img_config = config.get('image_generation', {})
+    if img_config.get('enabled', False):
+        print("\n[CHECK] Image generation...")
+        if not ml_stack_available():
+            print("[ERROR] torch/diffusers are not installed.")
+            ok = False
+        model_id = img_config.get('model_id', "")
+        if model_id.endswith((".safetensors", ".ckpt")) and not os.path.isfile(model_id):
+            print(f"[ERROR] Model file not found: {model_id}")
+            ok = False
+        else:
+            print(f"[SUCCESS] Model: {model_id}")
+
+    print(f"\n[CHECK] {'All checks passed.' if ok else 'Some checks failed.'}")
+    return ok
+
+def run_cycle(config, generator, uploader, image_generator, eyecatch_library, eyecatch_bank, image_cache):
+    """Runs one report cycle, pausing the background eyecatch bank meanwhile."""
+    if eyecatch_bank is not None:
+        eyecatch_bank.begin_cycle()
+    try:
+        run_report(config, generator, uploader, image_generator, eyecatch_library, eyecatch_bank, image_cache)
+    finally:
+        if eyecatch_bank is not None:
+            eyecatch_bank.end_cycle()
+
+def apply_config_changes(old_config, new_config, generator, image_generator, eyecatch_bank=None):
+    """
+    Applies a reloaded config to long-lived components.
+    Genres, prompts, image settings and the schedule are read from the config every cycle;
+    only settings held by components need to be pushed here.
+    """
+    if new_config.get('gemini_model') != old_config.get('gemini_model'):
+        generator.model_name = new_config.get('gemini_model', generator.model_name)
+        print(f"[INFO] Gemini model changed to {generator.model_name}")
+    generator.router.configure(new_config.get('model_routing'))
+    generator.caller.configure(new_config.get('gemini_client'))
+    # The raw system prompt is kept static; placeholder values are sent per request
+    generator.system_prompt = new_config['system_prompt']
+    generator.use_search = new_config.get('use_search', True)
+
+    old_img = old_config.get('image_generation', {})
+    new_img = new_config.get('image_generation', {})
+    for key in ('enabled', 'model_id', 'device', 'worker', 'threads', 'weights', 'unet_cache', 'residency'):
+        if old_img.get(key) != new_img.get(key):
+            print(f"[WARN] image_generation.{key} changed. Restart to apply it (the loaded pipeline is kept).")
+    if image_generator and new_img.get('scheduler') != old_img.get('scheduler'):
+        scheduler = new_img.get('scheduler', 'Euler a')
+        # Applied before the next render (never during one, e.g. a background bank render)
+        if hasattr(image_generator, 'generator_kwargs'):
+            # Worker: restarted with the new scheduler when its next job starts
+            image_generator.generator_kwargs['scheduler_name'] = scheduler
+        else:
+            image_generator.scheduler_name = scheduler
+        print(f"[INFO] Image scheduler changed to {scheduler} (applies from the next render)")
+
+    if eyecatch_bank is not None:
+        eyecatch_bank.prompts = list(new_img.get('prompts', []))
+        eyecatch_bank.render_kwargs = get_render_kwargs(new_img)
+        eyecatch_bank.schedule_times = get_schedule_times(new_config)
+        # A bank started without prompts never ran its thread; start it once prompts exist
+        eyecatch_bank.start()
+        eyecatch_bank.wakeup.set()
+
+def get_schedule_times(config):
+    raw_schedule_times = config.get('schedule_times', ["08:00", "20:00"])
+    # Normalize times to ensure HH:MM format (e.g., "9:00" -> "09:00")
+    return [t.strip().zfill(5) for t in raw_schedule_times]
+
 def main():
+    args = parse_args()
     print("=== Note.com AI Writer (Scheduled Mode) ===")
     print("Schedule: Startup, 08:00, 20:00")
     
     # 1. Load Config
     try:
-        config = load_config()
+        watcher = ConfigWatcher()
+        config = watcher.config
     except Exception as e:
         print(f"[FATAL] {e}")
         sys.exit(1)
@@ -173,72 +692,74 @@ def main():
         print("[INFO] Please update config.yaml and run again.")
         sys.exit(0)
 
+    if args.check:
+        ok = run_check(config)
+        if args.import_report:
+            lazy_imports.print_report()
+        sys.exit(0 if ok else 1)
+
     # 2. Initialize Components
-    generator = GeminiGenerator(
-        api_key=config['gemini_api_key'],
-        model_name=config.get('gemini_model', 'gemini-2.0-flash-exp'),
-        system_prompt=config['system_prompt'],
-        use_search=config.get('use_search', True)
-    )
+    generator = create_generator(config)
     
     # Initialize Image Generator if enabled
-    image_generator = None
-    img_config = config.get('image_generation', {})
-    if img_config.get('enabled', False):
-        if LocalImageGenerator:
-            try:
-                device = img_config.get('device', 'cpu')
-                scheduler = img_config.get('scheduler', 'Euler a')
-                print(f"[INIT] Initializing Local Image Generator config (Model: {img_config.get('model_id')}, Device: {device}, Scheduler: {scheduler})...")
-                image_generator = LocalImageGenerator(
-                    model_id=img_config.get('model_id', "runwayml/stable-diffusion-v1-5"),
-                    device=device,
-                    scheduler_name=scheduler
-                )
-            except Exception as e:
-                print(f"[ERROR] Failed to initialize image generator: {e}")
-        else:
-            print("[WARN] LocalImageGenerator not found. Please install requirements.")
+    image_generator = create_image_generator(config)
+
+    recorder = None
+    if args.record_traffic:
+        TrafficRecorder = lazy_imports.load("note_traffic").TrafficRecorder
+        recorder = TrafficRecorder()
+        print(f"[INFO] Recording note.com API traffic to {args.record_traffic}")
 
     # Handle Note Auth
-    session_cookie = config.get('note_session_cookie')
-    if session_cookie and not session_cookie.startswith("YOUR_"):
-        uploader = NoteUploader(session_cookie=session_cookie)
-        print("[INFO] Using configured session cookie.")
-    else:
-        print("[INFO] Session cookie not found. Attempting auto-login...")
-        email = config.get('note_email')
-        password = config.get('note_password')
-        
-        if email and password:
-            uploader = NoteUploader()
-            if not uploader.login(email, password):
-                print("[FATAL] Auto-login failed. Please check credentials or use session cookie.")
-                sys.exit(1)
-        else:
-            print("[FATAL] No session cookie and no credentials provided.")
-            sys.exit(1)
+    uploader = create_uploader(config, recorder)
+    if uploader is None:
+        sys.exit(1)
+
+    eyecatch_library = create_eyecatch_library(config)
+    eyecatch_bank = create_eyecatch_bank(config, image_generator)
+    image_cache = create_image_cache(config)
+
+    if args.import_report:
+        lazy_imports.print_report()
 
     # --- Execution Loop ---
     
     # 1. Run Immediately on Startup
     print("\n[SCHEDULE] Running startup job...")
-    run_report(config, generator, uploader, image_generator)
+    run_cycle(watcher.render(), generator, uploader, image_generator, eyecatch_library, eyecatch_bank, image_cache)
+    if recorder:
+        recorder.save(args.record_traffic)
+    # Pre-create empty drafts for the next cycles while idle
+    uploader.fill_draft_pool()
+
+    # Fill the eyecatch bank in the background while waiting for the next slot
+    if eyecatch_bank is not None:
+        eyecatch_bank.start()
+    if args.import_report:
+        lazy_imports.print_report()
 
     # 2. Enter Scheduler Loop
-    raw_schedule_times = config.get('schedule_times', ["08:00", "20:00"])
-    # Normalize times to ensure HH:MM format (e.g., "9:00" -> "09:00")
-    schedule_times = [t.strip().zfill(5) for t in raw_schedule_times]
+    schedule_times = get_schedule_times(config)
     print(f"\n[SCHEDULE] Waiting for next scheduled time {schedule_times}...")
     print("Press Ctrl+C to stop.")
     
     while True:
+        # Hot reload: a changed config.yaml applies from the next cycle
+        if watcher.poll():
+            apply_config_changes(config, watcher.config, generator, image_generator, eyecatch_bank)
+            config = watcher.config
+            schedule_times = get_schedule_times(config)
+            print(f"[SCHEDULE] Schedule: {schedule_times}")
+
         now = datetime.now()
         current_time = now.strftime("%H:%M")
         
         if current_time in schedule_times:
             print(f"\n[SCHEDULE] It's {current_time}! Starting scheduled job.")
-            run_report(config, generator, uploader, image_generator)
+            run_cycle(watcher.render(), generator, uploader, image_generator, eyecatch_library, eyecatch_bank, image_cache)
+            if recorder:
+                recorder.save(args.record_traffic)
+            uploader.fill_draft_pool()
             # Wait 61 seconds to ensure we don't run again in the same minute
             time.sleep(61)
         
@@ -0,0 +1,132 @@
+import math
+import time
+import threading
+from collections import defaultdict, deque
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers (p in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LatencyTracker:
+    """
+    Rolling per-(model, call type) latency and token usage of Gemini calls.
+    """
+    def __init__(self, window=50, max_age_seconds=None):
+        self.window = window
+        # Samples older than this are ignored, so a model routed away from gets retried later
+        self.max_age_seconds = max_age_seconds
+        self.latencies = defaultdict(lambda: deque(maxlen=self.window))
+        self.tokens = defaultdict(lambda: deque(maxlen=self.window))
+        self.failures = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, model, call_type, seconds, usage=None, ok=True):
+        """
+        Records one call. 'usage' is the response's usage_metadata (may be None).
+        Failed calls still record their latency, since a slow failure is a latency signal too.
+        """
+        key = (model, call_type)
+        with self.lock:
+            self.latencies[key].append((time.time(), seconds))
+            if not ok:
+                self.failures[key] += 1
+            if usage is not None:
+                self.tokens[key].append((
+                    getattr(usage, "prompt_token_count", None) or 0,
+                    getattr(usage, "candidates_token_count", None) or 0,
+                ))
+
+    def _recent(self, key):
+        cutoff = time.time() - self.max_age_seconds if self.max_age_seconds else None
+        return [seconds for ts, seconds in self.latencies.get(key, ()) if cutoff is None or ts >= cutoff]
+
+    def count(self, model, call_type):
+        """Number of recent samples for this model/call type."""
+        with self.lock:
+            return len(self._recent((model, call_type)))
+
+    def percentile(self, model, call_type, p):
+        with self.lock:
+            return percentile(self._recent((model, call_type)), p)
+
+    def summary(self):
+        """Returns printable lines with p50/p90, call count and mean tokens per (model, call type)."""
+        lines = []
+        with self.lock:
+            for (model, call_type), samples in sorted(self.latencies.items()):
+                values = [seconds for _, seconds in samples]
+                tokens = list(self.tokens.get((model, call_type), ()))
+                token_text = ""
+                if tokens:
+                    prompt_avg = sum(t[0] for t in tokens) / len(tokens)
+                    output_avg = sum(t[1] for t in tokens) / len(tokens)
+                    token_text = f", tokens in/out {prompt_avg:.0f}/{output_avg:.0f}"
+                lines.append(
+                    f"{model} [{call_type}]: n={len(values)}, p50 {percentile(values, 50):.1f}s, "
+                    f"p90 {percentile(values, 90):.1f}s, failures {self.failures.get((model, call_type), 0)}{token_text}"
+                )
+        return lines
+
+
+class ModelRouter:
+    """
+    Chooses the Gemini model for each call type so that a per-cycle latency budget is met.
+
+    The configured model is used unless its observed latency percentile for that call type
+    exceeds the call's own budget or the time left in the cycle; then the fallback model is used.
+    Without history for a model/call type, the configured model is tried first.
+    """
+    def __init__(self, routing=None, tracker=None):
+        self.tracker = tracker or LatencyTracker()
+        self.deadline = None
+        self.configure(routing)
+
+    def configure(self, routing):
+        """Applies (or re-applies after a config reload) the 'model_routing' settings."""
+        routing = routing or {}
+        self.fallback_model = routing.get('fallback_model') or None
+        self.cycle_budget = routing.get('cycle_budget_seconds')
+        self.percentile = routing.get('percentile', 90)
+        self.call_budgets = routing.get('call_budgets', {}) or {}
+        self.tracker.max_age_seconds = routing.get('history_hours', 12) * 3600
+
+    def begin_cycle(self):
+        """Starts the latency budget for a new cycle."""
+        self.deadline = time.monotonic() + self.cycle_budget if self.cycle_budget else None
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def route(self, call_type, model):
+        """Returns the model to use for this call and logs the decision."""
+        if not self.fallback_model or self.fallback_model == model:
+            return model
+
+        estimate = self.tracker.percentile(model, call_type, self.percentile)
+        remaining = self.remaining()
+        call_budget = self.call_budgets.get(call_type)
+
+        reason = None
+        if remaining is not None and remaining <= 0:
+            reason = "cycle budget exhausted"
+        elif estimate is not None and call_budget and estimate > call_budget:
+            reason = f"p{self.percentile} {estimate:.1f}s > call budget {call_budget}s"
+        elif estimate is not None and remaining is not None and estimate > remaining:
+            reason = f"p{self.percentile} {estimate:.1f}s > remaining {remaining:.0f}s"
+
+        if reason:
+            print(f"[ROUTE] {call_type}: {model} -> {self.fallback_model} ({reason})")
+            return self.fallback_model
+
+        estimate_text = f"p{self.percentile} {estimate:.1f}s" if estimate is not None else "no history"
+        remaining_text = f", remaining {remaining:.0f}s" if remaining is not None else ""
+        print(f"[ROUTE] {call_type}: {model} ({estimate_text}{remaining_text})")
+        return model
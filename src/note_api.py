@@ -1,12 +1,47 @@
 import requests
 import json
 import re
+import io
 import os
+import contextlib
+import time
+import uuid
+import html
+import hashlib
+import threading
+import mimetypes
 import markdown
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 class NoteUploader:
-    def __init__(self, session_cookie=None):
+    def __init__(self, session_cookie=None, base_url='https://note.com', pool_size=4, draft_pool=None):
+        """
+        Args:
+            session_cookie (str): Value of the note.com 'session' cookie.
+            base_url (str): API host. Point it at a local replay server to test offline.
+            pool_size (int): Concurrent body image uploads (upload_concurrency). The connection pool
+                keeps one more, for the eyecatch upload that runs alongside them.
+            draft_pool (dict): 'draft_pool' settings (size, path, verify_after_hours, max_age_hours).
+                Empty drafts are created ahead of time so create_article can skip that round trip.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.session_cookie = session_cookie
+        # Login email (set by login()); identifies the account when no cookie is configured
+        self.account = None
+        draft_pool = draft_pool or {}
+        self.draft_pool_size = draft_pool.get('size', 0)
+        self.draft_pool_path = draft_pool.get('path', 'note_drafts.json')
+        self.draft_verify_after = draft_pool.get('verify_after_hours', 36) * 3600
+        self.draft_max_age = draft_pool.get('max_age_hours', 72) * 3600
+        self.draft_lock = threading.Lock()
+        # Ids of pooled drafts in use by a create_article call; they leave the pool file only
+        # once the article is saved, so a failed upload returns them to the pool
+        self.reserved_drafts = set()
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size + 1)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'application/json'
@@ -40,7 +75,7 @@ class NoteUploader:
         Logs in to Note.com and retrieves the session cookie.
         """
         print(f"[INFO] Logging in as {email}...")
-        url = 'https://note.com/api/v1/sessions/sign_in'
+        url = f'{self.base_url}/api/v1/sessions/sign_in'
         payload = {
             'login': email,
             'password': password
@@ -63,6 +98,7 @@ class NoteUploader:
             data = response.json()
             if 'data' in data and 'email_confirmed_flag' in data['data']:
                 print("[SUCCESS] Login successful (User data received).")
+                self.account = email
                 return True
             else:
                 print("[ERROR] Login response did not contain expected user data.")
@@ -72,20 +108,65 @@ class NoteUploader:
             print(f"[ERROR] Login failed: {e}")
             return False
 
+    def check_auth(self):
+        """
+        Verifies that the current session is logged in.
+        """
+        url = f'{self.base_url}/api/v2/current_user'
+        try:
+            response = self.session.get(url, headers=self.get_headers())
+            response.raise_for_status()
+            data = response.json()
+            user = data.get('data') or {}
+            if user.get('urlname'):
+                print(f"[SUCCESS] Note.com session OK (User: {user['urlname']})")
+                return True
+            print("[ERROR] Note.com session is not logged in.")
+            return False
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"[ERROR] Note.com auth check failed: {e}")
+            return False
+
+    @staticmethod
+    def _image_payload(source):
+        """Returns bytes-like content for an in-memory image source (BytesIO is read without a copy)."""
+        if isinstance(source, io.BytesIO):
+            return source.getbuffer()
+        return source
+
+    @classmethod
+    def _describe_image(cls, source):
+        if isinstance(source, str):
+            return source
+        return f"<{memoryview(cls._image_payload(source)).nbytes} bytes in memory>"
+
+    @contextlib.contextmanager
+    def _image_file(self, source, default_name):
+        """
+        Yields the multipart tuple (name, content, mime type) for an image given as a file path
+        or as encoded bytes (bytes, bytearray, memoryview or BytesIO; sent as PNG).
+        """
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                yield (os.path.basename(source), f, mimetypes.guess_type(source)[0] or 'image/png')
+        else:
+            yield (default_name, self._image_payload(source), 'image/png')
+
     def upload_image(self, file_path, note_id):
         """
         Uploads an eyecatch image to Note.com for a specific note.
+        file_path: image path, or the encoded image itself (bytes, bytearray, memoryview or BytesIO).
         """
-        if not os.path.exists(file_path):
+        if isinstance(file_path, str) and not os.path.exists(file_path):
             print(f"[ERROR] Image file not found: {file_path}")
             return None
 
-        print(f"[INFO] Uploading eyecatch image for note_id {note_id}: {file_path}")
-        url = 'https://note.com/api/v1/image_upload/note_eyecatch'
+        print(f"[INFO] Uploading eyecatch image for note_id {note_id}: {self._describe_image(file_path)}")
+        url = f'{self.base_url}/api/v1/image_upload/note_eyecatch'
         
         try:
-            with open(file_path, 'rb') as f:
-                files = {'file': (os.path.basename(file_path), f, 'image/png')}
+            with self._image_file(file_path, 'eyecatch.png') as image_file:
+                files = {'file': image_file}
                 data = {'note_id': note_id}
                 
                 # Use Origin: note.com as verified
@@ -113,46 +194,274 @@ class NoteUploader:
                 print(f"[ERROR] Response: {e.response.text}")
             return None
 
-    def create_article(self, title, body_markdown, status='draft', eyecatch_path=None):
+    def upload_body_image(self, file_path, note_id):
+        """
+        Uploads an image to be embedded in the article body (a path or encoded bytes, as for upload_image).
+        Returns {'key': ..., 'url': ...} or None on failure.
+        """
+        url = f'{self.base_url}/api/v1/upload_image'
+        try:
+            with self._image_file(file_path, 'image.png') as image_file:
+                files = {'file': image_file}
+                headers = self.get_headers()
+                headers['Referer'] = f'https://editor.note.com/notes/{note_id}/edit'
+                response = self.session.post(url, headers=headers, files=files, data={'note_id': note_id})
+                response.raise_for_status()
+
+            data = response.json().get('data') or {}
+            if data.get('key') and data.get('url'):
+                return {'key': data['key'], 'url': data['url']}
+            print(f"[ERROR] Unexpected body image upload response: {data}")
+            return None
+        except (OSError, requests.exceptions.RequestException, ValueError) as e:
+            print(f"[ERROR] Body image upload failed ({self._describe_image(file_path)}): {e}")
+            return None
+
+    def upload_body_images(self, file_paths, note_id, max_workers=4):
+        """
+        Uploads body images concurrently over the session's connection pool.
+        Returns a list aligned with file_paths ({'key', 'url'} or None; None paths are skipped).
+        """
+        jobs = [(i, path) for i, path in enumerate(file_paths) if path]
+        results = [None] * len(file_paths)
+        if not jobs:
+            return results
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+            futures = {i: executor.submit(self.upload_body_image, path, note_id) for i, path in jobs}
+            for i, future in futures.items():
+                results[i] = future.result()
+        uploaded = sum(1 for r in results if r)
+        print(f"[INFO] Uploaded {uploaded}/{len(jobs)} body images in {time.perf_counter() - start:.1f}s")
+        return results
+
+    @staticmethod
+    def inject_section_images(body_html, images):
+        """
+        Inserts a figure after the n-th <h3> for the n-th uploaded image (None entries are skipped).
+        Images must follow the <h3> order of body_html, as main.markdown_sections() does.
+        """
+        headings = list(re.finditer(r'</h3>', body_html))
+        parts = []
+        position = 0
+        for match, image in zip(headings, images):
+            if not image:
+                continue
+            name = str(uuid.uuid4())
+            parts.append(body_html[position:match.end()])
+            parts.append(
+                f'<figure name="{name}" id="{name}"><img src="{html.escape(image["url"], quote=True)}" alt="">'
+                f'<figcaption></figcaption></figure>'
+            )
+            position = match.end()
+        parts.append(body_html[position:])
+        return "".join(parts)
+
+    def _draft_owner(self):
+        """
+        Identifies the account a pooled draft belongs to: the configured session cookie, or the
+        login email (the session cookie changes with every login). Only a hash is stored.
+        """
+        identity = self.session_cookie or self.account or ""
+        return hashlib.sha256(f"{self.base_url}|{identity}".encode("utf-8")).hexdigest()[:16]
+
+    def _load_draft_pool(self):
+        """Returns (own drafts, drafts of other accounts); the latter are kept in the file untouched."""
+        if not os.path.exists(self.draft_pool_path):
+            return [], []
+        try:
+            with open(self.draft_pool_path, 'r', encoding='utf-8') as f:
+                drafts = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Failed to read draft pool {self.draft_pool_path}: {e}")
+            return [], []
+        owner = self._draft_owner()
+        return [d for d in drafts if d.get('owner') == owner], [d for d in drafts if d.get('owner') != owner]
+
+    def _save_draft_pool(self, drafts, others):
+        tmp_path = self.draft_pool_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(others + drafts, f, indent=2)
+        os.replace(tmp_path, self.draft_pool_path)
+
+    def draft_pool_status(self):
+        """Returns a printable line about the pooled drafts of the current account."""
+        drafts, _ = self._load_draft_pool()
+        stale = sum(1 for d in drafts if time.time() - d['created'] > self.draft_max_age)
+        return f"{len(drafts)}/{self.draft_pool_size} pooled drafts ({stale} stale, removed on the next refill)"
+
+    def _create_draft(self):
+        """
+        Creates an empty draft. Returns (note_id, note_key); raises RequestException on failure.
+        """
+        url_create = f'{self.base_url}/api/v1/text_notes'
+        payload_create = {"template_key": None}
+        response = self.session.post(url_create, headers=self.get_headers(), json=payload_create)
+        response.raise_for_status()
+        data = response.json()
+        return data['data']['id'], data['data']['key']
+
+    def _draft_is_usable(self, draft):
+        """Checks that a pooled draft still exists and is still an untouched draft."""
+        url = f"{self.base_url}/api/v3/notes/{draft['key']}"
+        try:
+            response = self.session.get(url, headers=self.get_headers())
+            if response.status_code == 404:
+                return False
+            response.raise_for_status()
+            note = response.json().get('data') or {}
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"[WARN] Could not verify pooled draft {draft['key']}: {e}")
+            return False
+        return note.get('status') == 'draft' and not note.get('body') and not note.get('name')
+
+    def _delete_draft(self, draft):
+        """Deletes a pooled draft that is no longer needed, so it does not linger on the account."""
+        url = f"{self.base_url}/api/v1/notes/{draft['id']}"
+        try:
+            response = self.session.delete(url, headers=self.get_headers())
+            if response.status_code != 404:
+                response.raise_for_status()
+            print(f"[INFO] Deleted stale pooled draft {draft['key']}")
+        except requests.exceptions.RequestException as e:
+            print(f"[WARN] Failed to delete pooled draft {draft['key']}: {e}")
+
+    def fill_draft_pool(self):
+        """
+        Deletes drafts older than max_age_hours (if still empty) and tops the draft pool up to
+        its configured size. Call it off the critical path (at startup or after a cycle).
+        Returns the number of drafts in the pool.
+        """
+        if self.draft_pool_size <= 0:
+            return 0
+        with self.draft_lock:
+            drafts, others = self._load_draft_pool()
+            fresh = []
+            for draft in drafts:
+                if draft['id'] in self.reserved_drafts or time.time() - draft['created'] <= self.draft_max_age:
+                    fresh.append(draft)
+                elif self._draft_is_usable(draft):
+                    # Still empty: ours to remove (a draft the user has written in is left alone)
+                    self._delete_draft(draft)
+            drafts = fresh
+            # Drafts reserved by an in-flight create_article do not count as available
+            missing = self.draft_pool_size - sum(1 for d in drafts if d['id'] not in self.reserved_drafts)
+            owner = self._draft_owner()
+            for _ in range(max(0, missing)):
+                try:
+                    note_id, note_key = self._create_draft()
+                except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                    print(f"[WARN] Failed to pre-create draft: {e}")
+                    break
+                drafts.append({'id': note_id, 'key': note_key, 'created': time.time(), 'owner': owner})
+            self._save_draft_pool(drafts, others)
+        if missing > 0:
+            print(f"[INFO] Draft pool: {len(drafts)}/{self.draft_pool_size} empty drafts ready.")
+        return len(drafts)
+
+    def take_draft(self):
+        """
+        Reserves a pooled draft and returns its (note_id, note_key), or None if none is usable.
+        Call finish_draft() when done: the draft leaves the pool only if the article was saved.
+        Drafts older than verify_after_hours are checked with one GET before use;
+        drafts older than max_age_hours are skipped and left for fill_draft_pool to delete.
+        """
+        if self.draft_pool_size <= 0:
+            return None
+        with self.draft_lock:
+            drafts, others = self._load_draft_pool()
+            taken = None
+            kept = []
+            for draft in drafts:
+                age = time.time() - draft['created']
+                if taken is not None or age > self.draft_max_age or draft['id'] in self.reserved_drafts:
+                    kept.append(draft)
+                elif age > self.draft_verify_after and not self._draft_is_usable(draft):
+                    # Deleted or edited elsewhere: not ours to remove any more
+                    print(f"[INFO] Pooled draft {draft['key']} is no longer usable. Dropped.")
+                else:
+                    taken = draft
+                    kept.append(draft)
+                    self.reserved_drafts.add(draft['id'])
+            self._save_draft_pool(kept, others)
+            available = sum(1 for d in kept if d['id'] not in self.reserved_drafts)
+        if taken:
+            print(f"[INFO] Using pre-created draft. ID: {taken['id']}, Key: {taken['key']} ({available} left in pool)")
+            return taken['id'], taken['key']
+        return None
+
+    def finish_draft(self, note_id, note_key, saved, pooled):
+        """
+        Settles a draft used by create_article. A saved article's pooled draft leaves the pool;
+        after a failure the (still empty) draft is kept in or added to the pool for the next
+        attempt instead of being left behind on the account.
+        """
+        if self.draft_pool_size <= 0:
+            return
+        with self.draft_lock:
+            self.reserved_drafts.discard(note_id)
+            if saved and not pooled:
+                return
+            drafts, others = self._load_draft_pool()
+            if saved:
+                drafts = [d for d in drafts if d['id'] != note_id]
+            elif not pooled:
+                drafts.append({'id': note_id, 'key': note_key, 'created': time.time(), 'owner': self._draft_owner()})
+                print(f"[INFO] Draft {note_key} returned to the draft pool after the failed upload.")
+            self._save_draft_pool(drafts, others)
+
+    def create_article(self, title, body_markdown, status='draft', eyecatch_path=None, section_images=None,
+                       upload_concurrency=4):
         """
         Creates a new article on Note.com using the correct 2-step process.
+        eyecatch_path: image path, or the encoded image in memory (bytes, bytearray, memoryview or BytesIO).
+        section_images: optional list of images (paths or bytes), one per '###' section (None to skip a section).
         """
         print(f"[INFO] Creating article: {title} (Status: {status})")
         
         # Extract hashtags and convert body
         hashtags, body_html = self.process_markdown(body_markdown)
         
-        # Step 1: Create Draft (Minimal Payload) to get note_id
-        url_create = 'https://note.com/api/v1/text_notes'
-        payload_create = {"template_key": None}
-        
+        draft = None
+        note_id = note_key = None
+        saved = False
         try:
-            response = self.session.post(url_create, headers=self.get_headers(), json=payload_create)
-            response.raise_for_status()
-            data = response.json()
-            
-            note_id = data['data']['id']
-            note_key = data['data']['key']
-            print(f"[INFO] Draft created. ID: {note_id}, Key: {note_key}")
+            # Step 1: Take a pre-created draft, or create one (Minimal Payload) to get note_id
+            draft = self.take_draft()
+            if draft:
+                note_id, note_key = draft
+            else:
+                note_id, note_key = self._create_draft()
+                print(f"[INFO] Draft created. ID: {note_id}, Key: {note_key}")
             
             # Step 2: Upload Eyecatch if provided (Now that we have note_id)
             eyecatch_key = None
-            if eyecatch_path:
-                # Note: The upload endpoint returns a URL. 
-                # We assume the upload associates the image with the note automatically.
-                # However, update_article might need the key.
-                # The key is usually part of the URL or returned.
-                # But based on user's log, we only got URL.
-                # Let's try to pass the URL as key? No, key is usually a hash.
-                # If we don't pass eyecatch_key to update_article, maybe it stays?
-                # Let's try passing None for eyecatch_key first.
-                self.upload_image(eyecatch_path, note_id)
+            # Note: The upload endpoint returns a URL. 
+            # We assume the upload associates the image with the note automatically.
+            # However, update_article might need the key.
+            # The key is usually part of the URL or returned.
+            # But based on user's log, we only got URL.
+            # Let's try to pass the URL as key? No, key is usually a hash.
+            # If we don't pass eyecatch_key to update_article, maybe it stays?
+            # Let's try passing None for eyecatch_key first.
+            image_keys = []
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # The eyecatch upload runs alongside the body image uploads
+                eyecatch_future = executor.submit(self.upload_image, eyecatch_path, note_id) if eyecatch_path else None
+                if section_images:
+                    uploaded = self.upload_body_images(section_images, note_id, max_workers=upload_concurrency)
+                    body_html = self.inject_section_images(body_html, uploaded)
+                    image_keys = [image['key'] for image in uploaded if image]
+                if eyecatch_future:
+                    eyecatch_future.result()
             
             # Step 3: Update Draft with Content
             # We combine update and publish into one PUT request if status is published
             final_status = 'published' if status == 'published' else 'draft'
             
-            if self.update_article(note_id, note_key, title, body_html, hashtags, status=final_status, eyecatch_key=eyecatch_key):
+            if self.update_article(note_id, note_key, title, body_html, hashtags, status=final_status, eyecatch_key=eyecatch_key,
+                                   image_keys=image_keys):
                 if final_status == 'published':
                     print(f"[SUCCESS] Article published! Key: {note_key}")
                 else:
@@ -161,6 +470,7 @@ class NoteUploader:
                 print(f"[ERROR] Failed to save/publish content.")
                 return None
             
+            saved = True
             return f"https://note.com/notes/{note_key}"
 
         except requests.exceptions.RequestException as e:
@@ -168,13 +478,17 @@ class NoteUploader:
             if hasattr(e, 'response') and e.response is not None:
                 print(f"[ERROR] Response: {e.response.text}")
             return None
+        finally:
+            if note_id is not None:
+                self.finish_draft(note_id, note_key, saved, pooled=draft is not None)
 
-    def update_article(self, note_id, note_key, title, body, hashtags, status='draft', eyecatch_key=None):
+    def update_article(self, note_id, note_key, title, body, hashtags, status='draft', eyecatch_key=None, image_keys=None):
         """
         Updates an existing article with full payload.
+        image_keys: keys of images embedded in the body.
         """
         print(f"[INFO] Updating article (ID: {note_id})...")
-        url = f'https://note.com/api/v1/text_notes/{note_id}'
+        url = f'{self.base_url}/api/v1/text_notes/{note_id}'
         
         # Full payload based on GitHub30/note-mcp-server
         payload = {
@@ -185,7 +499,7 @@ class NoteUploader:
             "exclude_ai_learning_reward": False,
             "free_body": body,
             "hashtags": hashtags, 
-            "image_keys": [],
+            "image_keys": list(image_keys or []),
             "index": False,
             "is_refund": False,
             "limited": False,
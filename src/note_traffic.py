@@ -0,0 +1,263 @@
+import re
+import json
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Exchanges worth keeping as fixtures (sign_in, text_notes create/PUT, image_upload, ...)
+API_PATH_PATTERN = re.compile(r"^/api/v\d+/")
+SENSITIVE_HEADERS = {"cookie", "set-cookie", "x-xsrf-token", "authorization"}
+SENSITIVE_FIELDS = {"password", "login", "email"}
+# Hop-by-hop / length headers that the replay server must compute itself
+SKIPPED_REPLAY_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "connection", "set-cookie"}
+
+
+def is_api_url(url):
+    return bool(API_PATH_PATTERN.match(urlsplit(url).path))
+
+
+def normalize_path(path):
+    """Replaces note IDs (numeric) and note keys (n + 12 hex) so fixtures match any note."""
+    segments = []
+    for segment in path.split("/"):
+        if segment.isdigit() or re.fullmatch(r"n[0-9a-f]{12}", segment):
+            segment = "*"
+        segments.append(segment)
+    return "/".join(segments)
+
+
+def _redact_headers(headers):
+    return [
+        {"name": name, "value": "REDACTED" if name.lower() in SENSITIVE_HEADERS else str(value)}
+        for name, value in headers.items()
+    ]
+
+
+def _redact_fields(data):
+    """Masks sensitive fields at any depth (e.g. data.email in the sign_in response)."""
+    if isinstance(data, dict):
+        return {
+            key: "REDACTED" if key in SENSITIVE_FIELDS else _redact_fields(value)
+            for key, value in data.items()
+        }
+    if isinstance(data, list):
+        return [_redact_fields(item) for item in data]
+    return data
+
+
+def _redact_body(text, mime_type):
+    """Masks credentials in JSON bodies and replaces binary/multipart bodies with a size note."""
+    if text is None:
+        return None
+    if isinstance(text, bytes):
+        if "multipart" in (mime_type or "") or "image" in (mime_type or ""):
+            return f"<{mime_type or 'binary'} body, {len(text)} bytes>"
+        text = text.decode("utf-8", errors="replace")
+    # Parse regardless of the declared type so credentials never slip through
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    return json.dumps(_redact_fields(data), ensure_ascii=False)
+
+
+def _har_entry(method, url, request_headers, request_body, status, status_text,
+               response_headers, response_body, response_mime, started, elapsed_ms):
+    request_mime = next((v for k, v in request_headers.items() if k.lower() == "content-type"), "")
+    return {
+        "startedDateTime": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+        "time": round(elapsed_ms, 3),
+        "request": {
+            "method": method,
+            "url": url,
+            "httpVersion": "HTTP/1.1",
+            "headers": _redact_headers(request_headers),
+            "queryString": [],
+            "cookies": [],
+            "headersSize": -1,
+            "bodySize": len(request_body) if request_body else 0,
+            "postData": {"mimeType": request_mime, "text": _redact_body(request_body, request_mime) or ""},
+        },
+        "response": {
+            "status": status,
+            "statusText": status_text or "",
+            "httpVersion": "HTTP/1.1",
+            "headers": _redact_headers(response_headers),
+            "cookies": [],
+            "content": {"size": len(response_body or ""), "mimeType": response_mime or "",
+                        "text": _redact_body(response_body, response_mime) or ""},
+            "redirectURL": "",
+            "headersSize": -1,
+            "bodySize": len(response_body or ""),
+        },
+        "cache": {},
+        "timings": {"send": 0, "wait": round(elapsed_ms, 3), "receive": 0},
+    }
+
+
+def save_har(entries, path, creator="note-traffic"):
+    """Writes entries as a HAR 1.2 file."""
+    har = {"log": {"version": "1.2", "creator": {"name": creator, "version": "1"}, "entries": entries}}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(har, f, indent=2, ensure_ascii=False)
+    print(f"[INFO] Saved {len(entries)} API exchanges to {path}")
+
+
+def load_har(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["log"]["entries"]
+
+
+class TrafficRecorder:
+    """
+    Records note.com API exchanges made through a requests.Session (e.g. NoteUploader.session).
+    Credentials and cookies are redacted; binary uploads are stored as size notes only.
+    """
+    def __init__(self):
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def attach(self, session):
+        session.hooks.setdefault("response", []).append(self._on_response)
+        return self
+
+    def _on_response(self, response, *args, **kwargs):
+        request = response.request
+        if not is_api_url(request.url):
+            return response
+        elapsed_ms = response.elapsed.total_seconds() * 1000
+        entry = _har_entry(
+            request.method, request.url, dict(request.headers), request.body,
+            response.status_code, response.reason, dict(response.headers),
+            response.text, response.headers.get("Content-Type", ""),
+            time.time() - elapsed_ms / 1000, elapsed_ms,
+        )
+        with self.lock:
+            self.entries.append(entry)
+        return response
+
+    def save(self, path):
+        with self.lock:
+            save_har(list(self.entries), path)
+
+
+def har_from_performance_log(messages, get_body=None):
+    """
+    Builds HAR entries for API calls from Chrome performance log messages
+    (driver.get_log('performance')). get_body(request_id) may return the response body text.
+    """
+    requests_by_id = {}
+    for message in messages:
+        log = json.loads(message["message"])["message"]
+        params = log.get("params", {})
+        request_id = params.get("requestId")
+        if log["method"] == "Network.requestWillBeSent":
+            if is_api_url(params["request"]["url"]):
+                requests_by_id[request_id] = {"request": params["request"], "start": params["timestamp"],
+                                              "wall": params.get("wallTime", time.time())}
+        elif request_id in requests_by_id:
+            if log["method"] == "Network.responseReceived":
+                requests_by_id[request_id]["response"] = params["response"]
+            elif log["method"] == "Network.loadingFinished":
+                requests_by_id[request_id]["end"] = params["timestamp"]
+
+    entries = []
+    for request_id, item in requests_by_id.items():
+        response = item.get("response")
+        if response is None:
+            continue
+        body = None
+        if get_body:
+            try:
+                body = get_body(request_id)
+            except Exception as e:
+                print(f"[WARN] Could not read response body for {item['request']['url']}: {e}")
+        elapsed_ms = (item.get("end", item["start"]) - item["start"]) * 1000
+        request = item["request"]
+        entries.append(_har_entry(
+            request["method"], request["url"], request.get("headers", {}), request.get("postData"),
+            response["status"], response.get("statusText"), response.get("headers", {}),
+            body, response.get("mimeType", ""), item["wall"], elapsed_ms,
+        ))
+    entries.sort(key=lambda e: e["startedDateTime"])
+    return entries
+
+
+class ReplayState:
+    """Fixture lookup, latency shaping and fault injection shared by the replay handlers."""
+    def __init__(self, entries, time_scale=1.0, extra_latency=0.0, fail_rate=0.0, fail_status=503, seed=None):
+        self.fixtures = {}
+        for entry in entries:
+            key = (entry["request"]["method"], normalize_path(urlsplit(entry["request"]["url"]).path))
+            self.fixtures.setdefault(key, []).append(entry)
+        self.time_scale = time_scale
+        self.extra_latency = extra_latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.random = random.Random(seed)
+        self.positions = {}
+        self.stats = {"served": 0, "injected_failures": 0, "unmatched": 0}
+        self.lock = threading.Lock()
+
+    def next_response(self, method, path):
+        """Returns (delay_seconds, status, headers, body) for a request."""
+        key = (method, normalize_path(urlsplit(path).path))
+        with self.lock:
+            candidates = self.fixtures.get(key)
+            if not candidates:
+                self.stats["unmatched"] += 1
+                return 0.0, 404, {"Content-Type": "application/json"}, json.dumps({"error": f"no fixture for {key}"})
+            # Replay in recorded order, wrapping around
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            entry = candidates[position % len(candidates)]
+            delay = entry["time"] / 1000 * self.time_scale + self.extra_latency
+            if self.fail_rate and self.random.random() < self.fail_rate:
+                self.stats["injected_failures"] += 1
+                return delay, self.fail_status, {"Content-Type": "application/json"}, json.dumps({"error": "injected failure"})
+            self.stats["served"] += 1
+
+        response = entry["response"]
+        headers = {h["name"]: h["value"] for h in response["headers"] if h["name"].lower() not in SKIPPED_REPLAY_HEADERS}
+        if response["content"].get("mimeType"):
+            headers["Content-Type"] = response["content"]["mimeType"]
+        return delay, response["status"], headers, response["content"].get("text", "")
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _serve(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        delay, status, headers, body = self.server.replay.next_response(self.command, self.path)
+        if delay > 0:
+            time.sleep(delay)
+        data = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+    def log_message(self, format, *args):
+        print(f"[REPLAY] {self.command} {self.path} -> {format % args}")
+
+
+def start_replay_server(entries, host="127.0.0.1", port=0, **replay_kwargs):
+    """
+    Starts a local server replaying HAR entries in a background thread.
+    Returns the server; its base URL is f"http://{host}:{server.server_port}".
+    """
+    server = ThreadingHTTPServer((host, port), _ReplayHandler)
+    server.daemon_threads = True
+    server.replay = ReplayState(entries, **replay_kwargs)
+    threading.Thread(target=server.serve_forever, name="note-replay", daemon=True).start()
+    return server
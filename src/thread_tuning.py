@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import platform
+import logging
+
+logger = logging.getLogger(__name__)
+
+TUNING_FILE = os.path.join("models", "thread_tuning.json")
+
+
+def host_signature():
+    """Returns a key identifying this host's CPU layout in the tuning file."""
+    return f"{platform.node()}|{platform.machine()}|{os.cpu_count()}"
+
+
+def available_cpus():
+    """Returns the list of CPU ids this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def load_tuning(path=TUNING_FILE):
+    """Loads the saved thread layout for this host, or None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get(host_signature())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read thread tuning file {path}: {e}")
+        return None
+
+
+def save_tuning(layout, path=TUNING_FILE):
+    """Saves the thread layout for this host, keeping entries of other hosts."""
+    data = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+    data[host_signature()] = layout
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    logger.info(f"Saved thread layout to {path}: {layout}")
+
+
+def apply_threads(torch, intra_op=None, inter_op=None):
+    """
+    Applies intra-/inter-op thread counts to torch.
+
+    Inter-op threads can only be set once per process (before any parallel work),
+    so a failure there is logged and otherwise ignored.
+    """
+    if intra_op:
+        torch.set_num_threads(int(intra_op))
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(int(inter_op))
+        except RuntimeError as e:
+            logger.info(f"Inter-op threads already fixed for this process ({torch.get_num_interop_threads()}): {e}")
+    logger.info(f"Torch threads: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}")
+
+
+def get_affinity():
+    """Returns the CPU affinity of the calling thread, or None if unsupported."""
+    if hasattr(os, "sched_getaffinity"):
+        return set(os.sched_getaffinity(0))
+    return None
+
+
+def set_affinity(cpus):
+    """
+    Pins the calling thread to the given CPU ids (Linux only).
+    Returns True if the affinity was changed.
+    """
+    if not cpus:
+        return False
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("CPU affinity is not supported on this platform. Skipping.")
+        return False
+    try:
+        os.sched_setaffinity(0, set(int(c) for c in cpus))
+        return True
+    except OSError as e:
+        logger.warning(f"Failed to set CPU affinity {cpus}: {e}")
+        return False
+
+
+def candidate_intra_op(cpus):
+    """Returns intra-op thread counts worth trying for the given CPUs, largest first."""
+    n = max(1, len(cpus))
+    return sorted({n, max(1, n - 1), max(1, (n * 3) // 4), max(1, n // 2)}, reverse=True)
+
+
+def measure_seconds_per_step(pipe, steps=4, width=256, height=256):
+    """
+    Runs a short render and returns the mean seconds per step.
+    The first step is excluded since it includes warm-up allocations.
+    """
+    marks = []
+
+    def on_step_end(pipeline, step, timestep, callback_kwargs):
+        marks.append(time.perf_counter())
+        return callback_kwargs
+
+    start = time.perf_counter()
+    pipe(
+        prompt="benchmark",
+        width=width,
+        height=height,
+        num_inference_steps=steps,
+        output_type="latent",
+        callback_on_step_end=on_step_end,
+        cross_attention_kwargs={},
+    )
+    if len(marks) >= 2:
+        return (marks[-1] - marks[0]) / (len(marks) - 1)
+    return (time.perf_counter() - start) / steps
+
+
+def auto_tune(torch, pipe, cpus=None, inter_op=None, path=TUNING_FILE):
+    """
+    Tries candidate intra-op thread counts on a short render and saves the fastest
+    layout for this host. Returns the chosen layout, or None if every run failed.
+
+    Only intra-op threads are searched: inter-op threads are fixed for the lifetime
+    of the process once set, so they are taken from config (default 1, since the
+    diffusion loop is a single sequential graph).
+    """
+    cpus = list(cpus or available_cpus())
+    logger.info(f"Auto-tuning torch thread layout on {len(cpus)} CPUs (first run only)...")
+    apply_threads(torch, inter_op=inter_op or 1)
+
+    previous = get_affinity()
+    pinned = set_affinity(cpus)
+    results = []
+    try:
+        for intra in candidate_intra_op(cpus):
+            torch.set_num_threads(intra)
+            try:
+                sps = measure_seconds_per_step(pipe)
+            except Exception as e:
+                logger.warning(f"Tuning run with {intra} threads failed: {e}")
+                continue
+            logger.info(f"  intra-op={intra}: {sps:.3f} s/step")
+            results.append((sps, intra))
+    finally:
+        if pinned and previous:
+            set_affinity(previous)
+
+    if not results:
+        return None
+
+    sps, intra = min(results)
+    layout = {
+        "intra_op": intra,
+        "inter_op": torch.get_num_interop_threads(),
+        "affinity": cpus,
+        "seconds_per_step": round(sps, 4),
+        "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    torch.set_num_threads(intra)
+    save_tuning(layout, path)
+    return layout
@@ -0,0 +1,120 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UNetFeatureCache:
+    """
+    DeepCache-style reuse of deep UNet features across denoising steps.
+
+    Every 'interval' UNet calls the full network runs and the output of the second-to-last
+    up block (the deep feature entering the shallowest up block) is stored. On the calls in
+    between, the deep down blocks, the mid block and all but the last up block are skipped:
+    only conv_in, the first down block and the last up block run, with the stored feature in
+    place of the skipped ones. This relies on the block layout of diffusers'
+    UNet2DConditionModel and works with any scheduler that calls the UNet once per step.
+    """
+
+    def __init__(self, unet, interval=3):
+        self.unet = unet
+        self.interval = max(1, int(interval))
+        self.originals = {}
+        self.calls = 0
+        self.use_cache = False
+        self.feature = None
+        self.full_steps = 0
+        self.cached_steps = 0
+
+    @property
+    def enabled(self):
+        return bool(self.originals)
+
+    def enable(self):
+        """Patches the UNet and its deep blocks. Does nothing for an unsupported UNet layout."""
+        if self.enabled or self.interval <= 1:
+            return
+        unet = self.unet
+        if len(getattr(unet, "down_blocks", ())) < 2 or len(getattr(unet, "up_blocks", ())) < 2:
+            logger.warning("UNet feature cache: unsupported UNet layout, disabled.")
+            return
+
+        self._patch(unet, self._wrap_unet(unet.forward))
+        for block in unet.down_blocks[1:]:
+            self._patch(block, self._wrap_skipped_down(block, block.forward))
+        if unet.mid_block is not None:
+            self._patch(unet.mid_block, self._wrap_skipped(unet.mid_block.forward))
+        for block in unet.up_blocks[:-2]:
+            self._patch(block, self._wrap_skipped(block.forward))
+        self._patch(unet.up_blocks[-2], self._wrap_cached_up(unet.up_blocks[-2].forward))
+        logger.info(f"UNet feature cache enabled (full UNet every {self.interval} steps).")
+
+    def disable(self):
+        """Restores the original forward methods."""
+        for module, forward in self.originals.values():
+            if forward is None:
+                del module.forward
+            else:
+                module.forward = forward
+        self.originals = {}
+        self.reset()
+
+    def release(self):
+        """Drops all references to the UNet (keeping the step counters) so it can be freed."""
+        self.originals = {}
+        self.unet = None
+        self.feature = None
+
+    def reset(self):
+        """Starts a new render: the next call runs the full UNet."""
+        self.calls = 0
+        self.use_cache = False
+        self.feature = None
+        self.full_steps = 0
+        self.cached_steps = 0
+
+    def _patch(self, module, forward):
+        # Keep an instance-level forward (if any) to restore; otherwise the class method applies again
+        self.originals[id(module)] = (module, module.__dict__.get("forward"))
+        module.forward = forward
+
+    @staticmethod
+    def _hidden_states(args, kwargs):
+        return kwargs["hidden_states"] if "hidden_states" in kwargs else args[0]
+
+    def _wrap_unet(self, forward):
+        def unet_forward(*args, **kwargs):
+            self.use_cache = self.feature is not None and self.calls % self.interval != 0
+            self.calls += 1
+            if self.use_cache:
+                self.cached_steps += 1
+            else:
+                self.full_steps += 1
+            return forward(*args, **kwargs)
+        return unet_forward
+
+    def _wrap_skipped(self, forward):
+        def skipped_forward(*args, **kwargs):
+            if self.use_cache:
+                # Output is ignored: the next consumer is skipped too, or replaced by the cached feature
+                return self._hidden_states(args, kwargs)
+            return forward(*args, **kwargs)
+        return skipped_forward
+
+    def _wrap_skipped_down(self, block, forward):
+        # Residual count must match what the up blocks slice off, even though the deep ones are skipped
+        res_count = len(block.resnets) + len(getattr(block, "downsamplers", None) or ())
+
+        def skipped_down_forward(*args, **kwargs):
+            if self.use_cache:
+                hidden_states = self._hidden_states(args, kwargs)
+                return hidden_states, (hidden_states,) * res_count
+            return forward(*args, **kwargs)
+        return skipped_down_forward
+
+    def _wrap_cached_up(self, forward):
+        def cached_up_forward(*args, **kwargs):
+            if self.use_cache:
+                return self.feature
+            self.feature = forward(*args, **kwargs)
+            return self.feature
+        return cached_up_forward
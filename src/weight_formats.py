@@ -0,0 +1,132 @@
+import os
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Storage/compute dtypes accepted in config and by convert_model.py
+DTYPES = ("float32", "float16", "bfloat16")
+DTYPE_SUFFIXES = {"float32": "fp32", "float16": "fp16", "bfloat16": "bf16"}
+# Pipeline components whose nn.Linear layers are int8-quantized (absent ones are skipped)
+QUANTIZED_COMPONENTS = ("unet", "text_encoder", "text_encoder_2")
+
+
+def converted_path(path, dtype):
+    """Returns the default output path for a converted model, e.g. models/x.safetensors -> models/x.fp16.safetensors."""
+    suffix = DTYPE_SUFFIXES[dtype]
+    if os.path.isdir(path):
+        return f"{path.rstrip(os.sep)}-{suffix}"
+    stem, _ = os.path.splitext(path)
+    return f"{stem}.{suffix}.safetensors"
+
+
+def _read_state_dict(torch, path):
+    if path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        return load_file(path, device="cpu")
+    checkpoint = torch.load(path, map_location="cpu", weights_only=True)
+    state_dict = checkpoint.get("state_dict", checkpoint)
+    return {k: v for k, v in state_dict.items() if isinstance(v, torch.Tensor)}
+
+
+def convert_checkpoint(src, dst, dtype="float16"):
+    """
+    Rewrites a model with its floating-point weights stored as dtype.
+
+    Single-file checkpoints (.safetensors/.ckpt) are written as one .safetensors file;
+    non-float tensors (e.g. position ids) are kept as they are. Diffusers model folders
+    are re-saved with save_pretrained. Returns (bytes_before, bytes_after).
+    """
+    import torch
+    target = getattr(torch, dtype)
+
+    if os.path.isdir(src):
+        import diffusers
+        pipe = diffusers.DiffusionPipeline.from_pretrained(src, torch_dtype=target)
+        pipe.save_pretrained(dst, safe_serialization=True)
+        return _tree_size(src), _tree_size(dst)
+
+    from safetensors.torch import save_file
+    state_dict = _read_state_dict(torch, src)
+    converted = {
+        name: (tensor.to(target) if tensor.is_floating_point() else tensor).contiguous()
+        for name, tensor in state_dict.items()
+    }
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    save_file(converted, dst, metadata={"format": "pt", "dtype": dtype})
+    return os.path.getsize(src), os.path.getsize(dst)
+
+
+def _tree_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(directory) for name in files
+    )
+
+
+def dtype_name(device, weights):
+    """
+    Returns the name of the dtype the pipeline runs in, without logging.
+    CUDA always uses float16. On CPU 'weights.dtype' is used, except that int8 dynamic
+    quantization needs float32 Linear layers.
+    """
+    if device == "cuda":
+        return "float16"
+    name = weights.get("dtype") or "float32"
+    if name not in DTYPES or (weights.get("quantize") == "int8" and name != "float32"):
+        return "float32"
+    return name
+
+
+def validate_weights(device, weights):
+    """
+    Logs problems with the 'weights' settings once (at configuration time) and returns
+    them with 'dtype' resolved to what compute_dtype() will use.
+    """
+    weights = dict(weights or {})
+    if device != "cuda":
+        name = weights.get("dtype") or "float32"
+        if name not in DTYPES:
+            logger.warning(f"Unknown weights.dtype '{name}', using float32.")
+        elif weights.get("quantize") == "int8" and name != "float32":
+            logger.warning(f"weights.quantize: int8 requires float32 compute; ignoring weights.dtype '{name}'.")
+        elif name == "float16":
+            logger.warning("float16 compute on CPU is slow on most processors; bfloat16 is usually the better choice.")
+        weights["dtype"] = dtype_name(device, weights)
+    return weights
+
+
+def compute_dtype(torch, device, weights):
+    """Returns the torch dtype the pipeline runs in (see dtype_name)."""
+    return getattr(torch, dtype_name(device, weights))
+
+
+def quantize_linear_int8(torch, pipe):
+    """
+    Replaces the nn.Linear layers of the UNet and text encoders with int8 dynamically
+    quantized versions (weights int8, activations quantized per batch). CPU only.
+    Returns the names of the quantized components.
+    """
+    quantized = []
+    for name in QUANTIZED_COMPONENTS:
+        module = getattr(pipe, name, None)
+        if module is None:
+            continue
+        torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        quantized.append(name)
+    logger.info(f"Applied int8 dynamic quantization to: {', '.join(quantized)}")
+    return quantized
+
+
+def psnr(image, reference):
+    """Peak signal-to-noise ratio (dB) of an image against a reference of the same size (inf if identical)."""
+    from PIL import ImageChops, ImageStat
+    image = image.convert("RGB")
+    reference = reference.convert("RGB")
+    if image.size != reference.size:
+        raise ValueError(f"Image sizes differ: {image.size} vs {reference.size}")
+    stat = ImageStat.Stat(ImageChops.difference(image, reference))
+    mse = sum(stat.sum2) / (len(stat.sum2) * image.width * image.height)
+    if mse == 0:
+        return float("inf")
+    return 10 * math.log10(255 ** 2 / mse)